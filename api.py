@@ -0,0 +1,336 @@
+"""Streamlit 화면을 거치지 않는 JSON HTTP API (ERP 연동·자동화용).
+
+python api.py --port 8600 으로 앱 옆에서 실행합니다. HTTP Basic 인증으로 auth.USERS 계정을 쓰고,
+단계 변경 권한은 화면과 같은 auth.is_authorized 규칙을 따릅니다.
+"""
+import argparse
+import base64
+import json
+import logging
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from auth import authenticate, is_authorized
+from bulk_import import IMPORT_ROLES, label_index, validate_record
+from db import (bulk_upsert_amounts, complete_steps_batch, fetch_department_inbox, init_db,
+                load_procedure_state, load_procedure_steps)
+from notify import batch_events, record_events, start_digest_scheduler
+from procedure import new_procedure_state
+from workflow import WORKFLOW
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+MAX_BODY_BYTES = 5 * 1024 * 1024
+BATCH_WINDOW = 0.005      # 금액 기록 요청을 모으는 최대 대기 시간(초)
+BATCH_MAX_REQUESTS = 200
+
+logger = logging.getLogger("site_cost.api")
+
+STEP_COLUMNS = ["단계번호", "작업내용", "담당부서", "상태", "기성금", "노무비", "투입비", "버전"]
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, detail=None):
+        super().__init__(message)
+        self.status = status
+        self.detail = detail
+
+
+class AmountWriter(threading.Thread):
+    """여러 요청의 금액 행을 모아 한 트랜잭션으로 기록하는 쓰기 스레드 (그룹 커밋).
+
+    요청 스레드는 submit()에서 자기 행이 커밋될 때까지 기다립니다. 동시에 들어온 요청이 많을수록
+    트랜잭션 하나에 더 많은 요청이 묶여 커밋 횟수가 줄어듭니다.
+    """
+
+    def __init__(self, window=BATCH_WINDOW, max_requests=BATCH_MAX_REQUESTS):
+        super().__init__(name="api-amount-writer", daemon=True)
+        self.window = window
+        self.max_requests = max_requests
+        self._queue = queue.Queue()
+        self.batches = 0
+        self.requests = 0
+
+    def submit(self, rows, user=""):
+        slot = {"rows": rows, "user": user, "done": threading.Event(), "error": None}
+        self._queue.put(slot)
+        slot["done"].wait()
+        if slot["error"] is not None:
+            raise slot["error"]
+        return len(rows)
+
+    def run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_requests:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                bulk_upsert_amounts([(slot["rows"], slot["user"]) for slot in batch], new_procedure_state)
+            except Exception as e:
+                for slot in batch:
+                    slot["error"] = e
+            finally:
+                self.batches += 1
+                self.requests += len(batch)
+                for slot in batch:
+                    slot["done"].set()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def amount_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = AmountWriter()
+            _writer.start()
+    return _writer
+
+
+# --- 📡 엔드포인트 ---
+def _param(query, name, required=True):
+    value = query.get(name, [None])[0]
+    if required and not value:
+        raise ApiError(400, f"'{name}' 파라미터가 필요합니다.")
+    return value
+
+
+def _int_param(query, name, default=None, low=None, high=None):
+    value = query.get(name, [default])[0]
+    if value is None:
+        raise ApiError(400, f"'{name}' 파라미터가 필요합니다.")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"'{name}' 파라미터는 정수여야 합니다: {value}")
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ApiError(400, f"'{name}' 파라미터 범위를 벗어났습니다: {number}")
+    return number
+
+
+def _check_site(site, detail=None):
+    # 등록되지 않은 현장명으로 절차·금액 행이 새로 만들어지지 않도록 함
+    if site not in WORKFLOW.sites:
+        raise ApiError(400, f"등록되지 않은 현장입니다: {site}", detail)
+
+
+def _procedure_key(site, year, month, cost_type):
+    return f"{site}_{year}_{int(month):02d}_{cost_type}"
+
+
+def get_procedure(user, role, query, body):
+    site, year, cost_type = _param(query, "site"), _param(query, "year"), _param(query, "cost_type")
+    month = _int_param(query, "month", low=1, high=12)
+    if not year.isdigit():
+        raise ApiError(400, f"'year' 파라미터는 숫자여야 합니다: {year}")
+    _check_site(site)
+    if cost_type not in WORKFLOW.steps:
+        raise ApiError(404, f"알 수 없는 비용유형: {cost_type}")
+    key = _procedure_key(site, year, month, cost_type)
+    steps = load_procedure_steps(site, year, month, cost_type)
+    return {
+        "key": key,
+        "state": load_procedure_state(key),
+        "steps": [dict(zip(STEP_COLUMNS, row[4:])) for row in steps],
+    }
+
+
+def get_inbox(user, role, query, body):
+    dept = query.get("dept", [None])[0] or (None if role == "관리자" else role)
+    if not is_authorized(role, dept):
+        raise ApiError(403, "다른 부서의 작업함은 조회할 수 없습니다.")
+    limit = min(_int_param(query, "limit", "50", low=1), 500)
+    offset = _int_param(query, "offset", "0", low=0)
+    rows = fetch_department_inbox(dept, limit, offset)
+    return {
+        "total": rows[0][7] if rows else 0,
+        "items": [dict(zip(["site", "year", "month", "cost_type", "step_no", "task", "dept"], row[:7]))
+                  for row in rows],
+    }
+
+
+def _items(body, name):
+    items = body.get(name) if isinstance(body, dict) else body
+    if isinstance(items, dict):
+        items = [items]
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, f"'{name}' 목록이 비어 있습니다.")
+    return items
+
+
+def post_advance(user, role, query, body):
+    """[{site, year, month, cost_type, step_no}, ...] 의 각 절차를 해당 단계에서 다음 단계로 넘깁니다."""
+    groups = {}
+    for item in _items(body, "items"):
+        try:
+            cost_type, step_no = item["cost_type"], int(item["step_no"])
+            proc = (str(item["site"]), str(item["year"]), f"{int(item['month']):02d}")
+        except (KeyError, TypeError, ValueError):
+            raise ApiError(400, "각 항목에 site, year, month, cost_type, step_no가 필요합니다.", item)
+        _check_site(proc[0], item)
+        if (cost_type, step_no) not in WORKFLOW.transitions:
+            raise ApiError(404, f"없는 단계입니다: {cost_type} {step_no}")
+        groups.setdefault((cost_type, step_no), []).append(proc)
+
+    # 권한은 기록 전에 모두 확인 (일부만 반영되지 않도록)
+    for cost_type, step_no in groups:
+        dept = WORKFLOW.step(cost_type, step_no).dept
+        if not is_authorized(role, dept):
+            raise ApiError(403, f"'{dept}' 담당 단계입니다: {cost_type} {step_no}")
+
+    completed, skipped = [], []
+    for (cost_type, step_no), procedures in groups.items():
+        done, skip = complete_steps_batch(cost_type, step_no, procedures, new_procedure_state)
+        record_events(batch_events(cost_type, step_no, done))
+        completed += [{"site": s, "year": y, "month": m, "cost_type": cost_type, "step_no": step_no}
+                      for s, y, m in done]
+        skipped += [{"site": s, "year": y, "month": m, "cost_type": cost_type, "step_no": step_no,
+                     "reason": reason} for s, y, m, reason in skip]
+    return {"completed": completed, "skipped": skipped}
+
+
+def post_amounts(user, role, query, body):
+    """[{현장명, 연도, 월, 비용항목, 금액}, ...] 을 검증해 기록합니다. 잘못된 항목은 건너뛰고 알려 줍니다."""
+    if role not in IMPORT_ROLES:
+        raise ApiError(403, "금액 일괄 입력 권한이 없습니다.")
+    labels = label_index()
+    rows, errors = [], []
+    for index, record in enumerate(_items(body, "records")):
+        try:
+            rows.append(validate_record(record, labels))
+        except (KeyError, TypeError) as e:
+            errors.append({"index": index, "error": f"필수 항목 누락: {e}"})
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+    if rows:
+        amount_writer().submit(rows, user)
+    return {"imported": len(rows), "errors": errors}
+
+
+def get_health(user, role, query, body):
+    writer = _writer
+    return {"ok": True, "batches": writer.batches if writer else 0, "requests": writer.requests if writer else 0}
+
+
+ROUTES = {
+    ("GET", "/health"): (get_health, False),
+    ("GET", "/procedures"): (get_procedure, True),
+    ("GET", "/inbox"): (get_inbox, True),
+    ("POST", "/advance"): (post_advance, True),
+    ("POST", "/amounts"): (post_amounts, True),
+}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 + Content-Length 로 연결을 유지해 요청마다 TCP 연결을 새로 맺지 않음
+    protocol_version = "HTTP/1.1"
+    server_version = "SiteCostAPI/1.0"
+    # 헤더와 본문을 따로 쓰므로 Nagle 알고리즘이 켜져 있으면 지연 ACK와 겹쳐 응답마다 ~40ms 지연됨
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _user(self):
+        """(아이디, 역할)을 반환합니다."""
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Basic "):
+            raise ApiError(401, "인증이 필요합니다.")
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode("utf-8").partition(":")
+        except ValueError:
+            raise ApiError(401, "인증 정보를 읽을 수 없습니다.")
+        role = authenticate(username, password)
+        if role is None:
+            raise ApiError(401, "아이디 또는 비밀번호가 올바르지 않습니다.")
+        return username, role
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ApiError(413, "요청 본문이 너무 큽니다.")
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "JSON 본문을 읽을 수 없습니다.")
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 401:
+            self.send_header("WWW-Authenticate", 'Basic realm="site-cost"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        try:
+            # 본문은 응답 전에 항상 읽어야 같은 연결의 다음 요청이 깨지지 않음
+            body = self._body() if method == "POST" else {}
+            route = ROUTES.get((method, url.path.rstrip("/") or "/"))
+            if route is None:
+                raise ApiError(404, f"없는 경로입니다: {method} {url.path}")
+            handler, needs_auth = route
+            user, role = self._user() if needs_auth else (None, None)
+            self._send(200, handler(user, role, parse_qs(url.query), body))
+        except ApiError as e:
+            payload = {"error": str(e)}
+            if e.detail is not None:
+                payload["detail"] = e.detail
+            self._send(e.status, payload)
+        except Exception as e:
+            logger.exception("API 처리 중 오류")
+            self._send(500, {"error": f"서버 오류: {e}"})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    init_db()
+    amount_writer()
+    start_digest_scheduler()
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="현장비용 관리 시스템 JSON API")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = make_server(args.host, args.port)
+    print(f"✅ API 서버 시작: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,17 @@ USERS = {
 
 MAX_LOGIN_ATTEMPTS = 5
 
+def authenticate(username, password):
+    """아이디·비밀번호가 맞으면 역할을, 아니면 None을 반환합니다."""
+    user = USERS.get(username)
+    if user and user["password"] == password:
+        return user["role"]
+    return None
+
+def is_authorized(role, dept):
+    """담당 부서이거나 관리자이면 해당 단계를 변경할 수 있습니다."""
+    return role == dept or role == "관리자"
+
 def login_view():
     st.sidebar.header("🔐 로그인")
 
@@ -23,11 +34,11 @@ def login_view():
             st.sidebar.error("🚫 로그인 시도 횟수를 초과했습니다.")
             return
 
-        user = USERS.get(username)
-        if user and user["password"] == password:
+        role = authenticate(username, password)
+        if role:
             st.session_state["logged_in"] = True
             st.session_state["user"] = username
-            st.session_state["role"] = user["role"]
+            st.session_state["role"] = role
             st.session_state["login_attempts"] = 0
         else:
             st.session_state["login_attempts"] += 1
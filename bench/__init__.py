@@ -0,0 +1,4 @@
+"""규모별 성능 측정용 벤치마크 도구 모음.
+
+    python -m bench.run --sites 20 --years 5 --out bench_result.json
+"""
@@ -0,0 +1,136 @@
+"""JSON API 부하 시험: 임시 DB로 API 서버를 띄우고 연결을 유지하는 클라이언트 여러 개로 요청을 보냅니다.
+
+조회(GET /procedures, /inbox)와 금액 입력(POST /amounts)을 섞어 보내고
+초당 요청 수, 경로별 p50/p95, 오류 수, 금액 기록 그룹 커밋 수를 JSON으로 출력합니다.
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COST_TYPE = "2. 기성금 청구 및 수금"
+ACCOUNT = ("finance1", "pass")
+
+
+def _auth_header(username, password):
+    return "Basic " + base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def client(port, requests, seed, sites, latencies, errors):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Authorization": _auth_header(*ACCOUNT), "Content-Type": "application/json"}
+    for _ in range(requests):
+        site, month = rng.choice(sites), rng.randint(1, 12)
+        roll = rng.random()
+        if roll < 0.6:
+            name, method, body = "GET /procedures", "GET", None
+            path = "/procedures?" + urllib.parse.urlencode(
+                {"site": site, "year": 2024, "month": month, "cost_type": COST_TYPE})
+        elif roll < 0.7:
+            name, method, path, body = "GET /inbox", "GET", "/inbox?limit=20", None
+        else:
+            name, method, path = "POST /amounts", "POST", "/amounts"
+            body = json.dumps({"records": [
+                {"현장명": site, "연도": 2024, "월": month, "비용항목": "투입비", "금액": rng.randint(1, 10**8)}
+            ]}, ensure_ascii=False).encode("utf-8")
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(f"{name}: {response.status}")
+        except Exception as e:
+            errors.append(f"{name}: {e!r}")
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        latencies.setdefault(name, []).append(time.perf_counter() - start)
+    conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="JSON API 부하 시험")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="클라이언트당 요청 수")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="결과 JSON 저장 경로 (기본: 표준 출력)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="scm-api-")
+    os.environ["SITE_COST_DB"] = os.path.join(workdir, "api.db")
+    os.environ.setdefault("SMTP_HOST", "127.0.0.1")
+    sys.path.insert(0, ROOT)
+
+    import api
+    server = api.make_server("127.0.0.1", 0)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # API는 등록되지 않은 현장을 거부하므로 절차 정의의 현장만 씀
+    from workflow import WORKFLOW
+    sites = list(WORKFLOW.sites)
+    per_client = [{} for _ in range(args.clients)]
+    errors = []
+    threads = [
+        threading.Thread(target=client, args=(port, args.requests, args.seed + i, sites, per_client[i], errors))
+        for i in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    merged = {}
+    for latencies in per_client:
+        for name, values in latencies.items():
+            merged.setdefault(name, []).extend(values)
+    total = sum(len(v) for v in merged.values())
+    writer = api.amount_writer()
+    report = {
+        "clients": args.clients,
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(total / elapsed, 1),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "amount_batches": writer.batches,
+        "amount_requests": writer.requests,
+        "endpoints": {
+            name: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+            }
+            for name, values in sorted(merged.items())
+        },
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""동시 작성자가 같은 절차를 갱신할 때 잃어버린 갱신이 없는지 확인하고 처리량을 측정합니다.
+
+각 작성자 스레드는 읽기 → 수정 → 버전 비교 저장을 충돌이 나면 다시 읽어 재시도합니다.
+절차 상태만 저장하는 경우와, 화면의 금액 저장처럼 단계 행·비용원장을 함께 기록하는 경우를 모두 검사합니다.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_KEY = "경합시험_2024_01_경합"
+CELL = ("경합시험", "2024", "02", "경합", 1)
+
+
+def _run_writers(writers, increments, worker):
+    barrier = threading.Barrier(writers)
+    conflicts = [0] * writers
+    errors = []
+
+    def target(index):
+        barrier.wait()
+        try:
+            for _ in range(increments):
+                conflicts[index] += worker()
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(conflicts), errors
+
+
+def _report(name, writers, increments, final, elapsed, conflicts, errors):
+    expected = writers * increments
+    return {
+        "target": name,
+        "writers": writers,
+        "expected": expected,
+        "final": final,
+        "lost_updates": expected - final,
+        "conflicts_retried": conflicts,
+        "errors": errors[:5],
+        "seconds": round(elapsed, 3),
+        "commits_per_sec": round(expected / elapsed, 1) if elapsed else None,
+    }
+
+
+def state_contention(writers, increments):
+    import db
+
+    db.save_procedure_state(STATE_KEY, {"current_step": 1, "status": {}, "amounts": {"횟수": 0}})
+
+    def increment():
+        retries = 0
+        while True:
+            state = db.load_procedure_state(STATE_KEY)
+            state["amounts"]["횟수"] += 1
+            try:
+                db.save_procedure_state(STATE_KEY, state)
+                return retries
+            except db.VersionConflict:
+                retries += 1
+
+    elapsed, conflicts, errors = _run_writers(writers, increments, increment)
+    final = db.load_procedure_state(STATE_KEY)["amounts"]["횟수"]
+    return _report("save_procedure_state", writers, increments, final, elapsed, conflicts, errors)
+
+
+def _read_amount():
+    import db
+    with db.get_connection() as conn:
+        return conn.execute('''
+            SELECT IFNULL(SUM(금액), 0) FROM 비용원장
+            WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=? AND 단계번호=? AND 비용항목='기성금'
+        ''', CELL).fetchone()[0]
+
+
+def ledger_contention(writers, increments):
+    """화면의 금액 저장처럼 절차 상태 버전 비교 저장과 같은 트랜잭션에서 원장 금액을 기록합니다."""
+    import db
+
+    key = "_".join(CELL[:4])
+    db.save_procedure_state(key, {"current_step": 1, "status": {}, "amounts": {}})
+
+    def increment():
+        retries = 0
+        while True:
+            # 상태를 먼저 읽으므로 그 뒤에 다른 작성자가 저장했다면 아래 저장이 충돌함
+            state = db.load_procedure_state(key)
+            amount = _read_amount()
+            try:
+                db.save_procedure_state(key, state, cells={CELL: "진행중"},
+                                        amounts=[(*CELL, "기성금", amount + 1)])
+                return retries
+            except db.VersionConflict:
+                retries += 1
+
+    elapsed, conflicts, errors = _run_writers(writers, increments, increment)
+    final = _read_amount()
+    return _report("save_procedure_state + 비용원장", writers, increments, final, elapsed, conflicts, errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="절차 동시 갱신 경합 시험")
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--increments", type=int, default=20)
+    parser.add_argument("--out", help="결과 JSON 저장 경로 (기본: 표준 출력)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="scm-contention-")
+    os.environ["SITE_COST_DB"] = os.path.join(workdir, "contention.db")
+    sys.path.insert(0, ROOT)
+
+    import db
+    db.init_db()
+    report = {
+        "results": [
+            state_contention(args.writers, args.increments),
+            ledger_contention(args.writers, args.increments),
+        ],
+        "pool": db.pool_stats(),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    if any(r["lost_updates"] or r["errors"] for r in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
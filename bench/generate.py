@@ -0,0 +1,67 @@
+import json
+import random
+import time
+
+import db
+from procedure import get_procedure_flow, COST_INPUT_CONDITIONS
+from workflow import WORKFLOW
+
+
+# main.py 사이드바에서 고를 수 있는 현장을 먼저 채워 procedure_flow_view 측정에도 데이터가 잡히게 함
+APP_SITES = list(WORKFLOW.sites)
+
+
+def site_names(count):
+    extra = [f"현장{i:03d}" for i in range(1, max(0, count - len(APP_SITES)) + 1)]
+    return (APP_SITES + extra)[:count]
+
+
+def generate(sites=10, years=3, start_year=2020, seed=42):
+    """db.DB_PATH에 현장 × 연도 × 12개월 × 비용유형 전체의 절차 데이터를 채웁니다.
+
+    같은 seed로는 항상 같은 데이터가 만들어집니다. 생성한 절차 수를 반환합니다.
+    """
+    rng = random.Random(seed)
+    flow = get_procedure_flow()
+    db.init_db()
+
+    step_rows, ledger_rows, state_rows = [], [], []
+    now = time.time()
+    for site in site_names(sites):
+        for year in range(start_year, start_year + years):
+            for month in range(1, 13):
+                for cost_type, steps in flow.items():
+                    current = rng.randint(1, len(steps) + 1)
+                    status, amounts = {}, {}
+                    for step_no, (task, dept) in enumerate(steps, start=1):
+                        # 화면 상태(JSON)는 완료 전 단계를 모두 진행중으로 두지만 단계 행은 이후 단계가 대기
+                        status[task] = "완료" if step_no < current else "진행중"
+                        cell = (site, str(year), f"{month:02d}", cost_type, step_no)
+                        label = COST_INPUT_CONDITIONS.get((cost_type, step_no))
+                        if label and step_no < current:
+                            amounts[label] = rng.randint(1, 500) * 1_000_000
+                            ledger_rows.append((*cell, label, amounts[label], "생성기", now))
+                        step_rows.append((*cell, task, dept, db._initial_status(current, step_no)))
+                    key = f"{site}_{year}_{month:02d}_{cost_type}"
+                    state_rows.append((key, json.dumps({
+                        "current_step": current,
+                        "status": status,
+                        "amounts": amounts,
+                        "total_steps": len(steps),
+                    }, ensure_ascii=False)))
+
+    # 금액은 비용원장에만 기록하고 절차상태 금액 컬럼은 기본값 0으로 둠 (월별요약은 원장 트리거로 집계)
+    with db.get_connection() as conn:
+        conn.executemany('''
+            INSERT OR REPLACE INTO 절차상태
+            (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서, 상태)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', step_rows)
+        conn.executemany('''
+            INSERT INTO 비용원장 (현장명, 연도, 월, 비용유형, 단계번호, 비용항목, 금액, 입력자, 입력시각)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ledger_rows)
+        conn.executemany("INSERT OR REPLACE INTO 절차진행상태 (키, 상태) VALUES (?, ?)", state_rows)
+        conn.commit()
+    db.bump_data_version()
+    return len(state_rows)
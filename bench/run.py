@@ -0,0 +1,198 @@
+"""절차상태 규모별 주요 진입점의 지연 시간을 측정해 JSON으로 출력합니다.
+
+측정 대상: fetch_summary_data, fetch_summary_page, save_procedure_state (직접 호출),
+procedure_flow_view, summary_dashboard (Streamlit AppTest로 main.py 리런)
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies, queries):
+    return {
+        "runs": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "queries_per_run": round(statistics.fmean(queries), 2),
+    }
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sql):
+        self.count += 1
+
+
+def measure(func, runs, counter):
+    latencies, queries = [], []
+    for i in range(runs):
+        before = counter.count
+        start = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - start)
+        queries.append(counter.count - before)
+    return summarize(latencies, queries)
+
+
+def _app(role):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=120)
+    at.session_state["logged_in"] = True
+    at.session_state["user"] = "bench"
+    at.session_state["role"] = role
+    at.session_state["email_enabled"] = False
+    return at
+
+
+def _widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(sites, years, reruns, seed):
+    import db
+    from bench.generate import APP_SITES, generate, site_names
+    from procedure import get_procedure_flow
+
+    gen_start = time.perf_counter()
+    procedures = generate(sites=sites, years=years, seed=seed)
+    gen_seconds = time.perf_counter() - gen_start
+
+    counter = QueryCounter()
+    db.set_statement_tracer(counter)
+    rng = random.Random(seed)
+    names = site_names(sites)
+    cost_types = list(get_procedure_flow())
+    year_values = [str(2020 + y) for y in range(years)]
+    results = {}
+
+    def cold_summary(_):
+        db.clear_query_cache()
+        db.fetch_summary_data()
+
+    results["fetch_summary_data (cold)"] = measure(cold_summary, reruns, counter)
+    results["fetch_summary_data (cached)"] = measure(lambda _: db.fetch_summary_data(), reruns, counter)
+
+    # 키셋 페이지네이션: 마지막 쪽 페이지도 첫 페이지와 같은 비용이어야 함
+    last_key = (names[-1], year_values[-1], "06")
+
+    def summary_page(i):
+        db.clear_query_cache()
+        db.fetch_summary_page(after=None if i % 2 == 0 else last_key, limit=50)
+
+    results["fetch_summary_page (cold)"] = measure(summary_page, reruns, counter)
+
+    flow = get_procedure_flow()
+
+    def save_step(i):
+        # 화면의 진행 상태 저장과 같은 경로: 절차 상태 버전 비교 저장 + 현재 단계 행을 한 트랜잭션에
+        site, year, month = rng.choice(names), rng.choice(year_values), f"{rng.randint(1, 12):02d}"
+        cost_type = rng.choice(cost_types)
+        key = f"{site}_{year}_{month}_{cost_type}"
+        state = db.load_procedure_state(key)
+        step_no = min(state["current_step"], len(flow[cost_type]))
+        task = flow[cost_type][step_no - 1][0]
+        상태 = "진행중" if state["status"][task] == "완료" else "완료"
+        state["status"][task] = 상태
+        db.save_procedure_state(key, state, cells={(site, year, month, cost_type, step_no): 상태})
+
+    results["save_procedure_state"] = measure(save_step, reruns, counter)
+
+    at = _app("관리자")
+    at.run()
+
+    def procedure_rerun(i):
+        _widget(at.selectbox, "현장명").select(rng.choice(APP_SITES[:sites]))
+        _widget(at.text_input, "연도").input(rng.choice(year_values))
+        _widget(at.selectbox, "월").select(f"{rng.randint(1, 12):02d}")
+        _widget(at.selectbox, "비용유형").select(rng.choice(cost_types))
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+
+    results["procedure_flow_view (rerun)"] = measure(procedure_rerun, reruns, counter)
+
+    dash = _app("관리자")
+    dash.run()
+    _widget(dash.checkbox, "📊 결과 리포트 보기").check()
+    dash.run()
+    for kind in ("trend", "cumulative", "margin"):
+        dash.toggle(key=f"chart_{kind}").set_value(True)
+
+    def dashboard_rerun(i):
+        if i and "dashboard_site" in dash.session_state:
+            dash.selectbox(key="dashboard_site").select(rng.choice(names))
+        dash.run()
+        if dash.exception:
+            raise RuntimeError(dash.exception[0].value)
+
+    results["summary_dashboard (rerun)"] = measure(dashboard_rerun, reruns, counter)
+    db.set_statement_tracer(None)
+
+    return {
+        "revision": git_revision(),
+        "sites": sites,
+        "years": years,
+        "procedures": procedures,
+        "seed": seed,
+        "generate_seconds": round(gen_seconds, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results,
+        "query_cache": db.query_cache_stats(),
+        "pool": db.pool_stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="현장비용 관리 시스템 규모별 벤치마크")
+    parser.add_argument("--sites", type=int, default=10)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="사용할 DB 경로 (기본: 임시 파일)")
+    parser.add_argument("--out", help="결과 JSON 저장 경로 (기본: 표준 출력)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="scm-bench-")
+    # db 모듈을 불러오기 전에 경로를 지정해야 실제 database.db를 건드리지 않음
+    os.environ["SITE_COST_DB"] = args.db or os.path.join(workdir, "bench.db")
+    sys.path.insert(0, ROOT)
+
+    report = run(args.sites, args.years, args.reruns, args.seed)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import csv
+import io
+import os
+import time
+
+import streamlit as st
+
+from db import bulk_upsert_amounts
+from procedure import new_procedure_state
+from workflow import WORKFLOW
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 200
+COLUMNS = ["현장명", "연도", "월", "비용항목", "금액"]
+IMPORT_ROLES = ("경영지원부", "관리자")
+
+
+def label_index():
+    """비용항목 → (비용유형, 단계번호, 작업내용, 담당부서)"""
+    index = {}
+    for label, steps in WORKFLOW.label_steps.items():
+        s = steps[0]
+        index[label] = (s.cost_type, s.no, s.task, s.dept)
+    return index
+
+
+def _iter_csv(file):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(file):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_records(file, filename):
+    """(행 번호, {컬럼: 값}) 을 한 줄씩 돌려줍니다. 첫 행은 헤더입니다."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv":
+        rows = _iter_csv(file)
+    elif ext in (".xlsx", ".xlsm"):
+        rows = _iter_xlsx(file)
+    else:
+        raise ValueError(f"지원하지 않는 파일 형식입니다: {ext}")
+
+    header = [str(c).strip() if c is not None else "" for c in next(rows, [])]
+    missing = [c for c in COLUMNS if c not in header]
+    if missing:
+        raise ValueError(f"필수 컬럼이 없습니다: {', '.join(missing)}")
+    positions = [header.index(c) for c in COLUMNS]
+
+    for line_no, row in enumerate(rows, start=2):
+        if not row or all(v in (None, "") for v in row):
+            continue
+        values = [row[i] if i < len(row) else None for i in positions]
+        yield line_no, dict(zip(COLUMNS, values))
+
+
+def validate_record(record, labels):
+    """검증된 DB 행 튜플을 반환하고, 잘못된 값이면 ValueError를 냅니다."""
+    site = str(record["현장명"] or "").strip()
+    if not site:
+        raise ValueError("현장명이 비어 있습니다.")
+    if site not in WORKFLOW.sites:
+        raise ValueError(f"등록되지 않은 현장: {site} (가능: {', '.join(WORKFLOW.sites)})")
+
+    try:
+        year = int(str(record["연도"]).strip())
+        month = int(str(record["월"]).strip())
+    except (TypeError, ValueError):
+        raise ValueError("연도/월은 숫자여야 합니다.")
+    if not (2000 <= year <= 2100):
+        raise ValueError(f"올바르지 않은 연도: {year}")
+    if not (1 <= month <= 12):
+        raise ValueError(f"올바르지 않은 월: {month}")
+
+    label = str(record["비용항목"] or "").strip()
+    if label not in labels:
+        raise ValueError(f"알 수 없는 비용항목: {label} (가능: {', '.join(labels)})")
+
+    try:
+        amount = int(str(record["금액"]).replace(",", "").strip().split(".")[0])
+    except (TypeError, ValueError):
+        raise ValueError(f"금액이 숫자가 아닙니다: {record['금액']}")
+    if amount < 0:
+        raise ValueError("금액은 0 이상이어야 합니다.")
+
+    cost_type, step_no, task, dept = labels[label]
+    return (site, str(year), f"{month:02d}", cost_type, step_no, task, dept, label, amount)
+
+
+def import_costs(file, filename, chunk_size=CHUNK_SIZE, 입력자=""):
+    """파일을 청크 단위로 읽어 검증하고 하나의 트랜잭션으로 기록합니다."""
+    labels = label_index()
+    result = {"rows": 0, "imported": 0, "error_count": 0, "errors": []}
+
+    def chunks():
+        chunk = []
+        for line_no, record in iter_records(file, filename):
+            result["rows"] += 1
+            try:
+                chunk.append(validate_record(record, labels))
+            except ValueError as e:
+                result["error_count"] += 1
+                if len(result["errors"]) < MAX_REPORTED_ERRORS:
+                    result["errors"].append({"행": line_no, "오류": str(e)})
+                continue
+            if len(chunk) >= chunk_size:
+                yield chunk, 입력자
+                chunk = []
+        if chunk:
+            yield chunk, 입력자
+
+    start = time.perf_counter()
+    result["imported"] = bulk_upsert_amounts(chunks(), new_procedure_state)
+    result["seconds"] = time.perf_counter() - start
+    result["rows_per_sec"] = result["rows"] / result["seconds"] if result["seconds"] else 0.0
+    return result
+
+
+def bulk_import_view():
+    st.header("📥 비용 일괄 업로드")
+    st.caption(f"CSV/XLSX 파일, 필수 컬럼: {', '.join(COLUMNS)}  ·  비용항목: {', '.join(WORKFLOW.label_steps)}")
+
+    uploaded = st.file_uploader("비용 파일 선택", type=["csv", "xlsx"], key="bulk_import_file")
+    if uploaded is None or not st.button("⬆️ 가져오기", key="bulk_import_run"):
+        return
+
+    try:
+        with st.spinner("가져오는 중..."):
+            result = import_costs(uploaded, uploaded.name, 입력자=st.session_state.get("user", ""))
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("저장된 행", f"{result['imported']:,}")
+    col2.metric("오류 행", f"{result['error_count']:,}")
+    col3.metric("처리 속도", f"{result['rows_per_sec']:,.0f} 행/초")
+    if result["error_count"]:
+        st.warning(f"⚠️ {result['error_count']}개 행을 건너뛰었습니다.")
+        st.dataframe(result["errors"], use_container_width=True, hide_index=True)
+    else:
+        st.success(f"✅ {result['imported']:,}행을 {result['seconds']:.2f}초 만에 저장했습니다.")
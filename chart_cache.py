@@ -0,0 +1,103 @@
+import io
+import threading
+import time
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+
+from profiling import span
+
+CHART_CACHE_MAX_BYTES = 32 * 1024 * 1024
+CHART_DPI = 200
+# api.py·manage.py 등 다른 프로세스의 쓰기는 이 프로세스의 데이터 버전을 올리지 않으므로 TTL로도 만료
+CHART_CACHE_TTL = 30.0
+
+
+def render_png(fig):
+    """그림을 PNG 바이트로 렌더링하고 figure를 닫아 메모리를 돌려줍니다."""
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", dpi=CHART_DPI, bbox_inches="tight")
+    finally:
+        plt.close(fig)
+    return buf.getvalue()
+
+
+class ChartCache:
+    """(현장, 데이터 버전, 차트 종류, ...) 키로 렌더링된 차트 바이트를 보관하는 LRU 캐시.
+
+    데이터 버전이 바뀌거나 ttl초가 지난 차트는 다시 그립니다.
+    """
+
+    def __init__(self, max_bytes=CHART_CACHE_MAX_BYTES, ttl=CHART_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        self._bytes -= len(self._items.pop(key)[1])
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                # 데이터가 바뀌었으면 이전 버전으로 그린 차트는 전부 폐기
+                for stale in list(self._items):
+                    self._drop(stale)
+                self._version = version
+            entry = self._items.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, data):
+        with self._lock:
+            if version != self._version or len(data) > self.max_bytes:
+                return
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (time.monotonic() + self.ttl, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def get_or_render(self, key, version, build_figure):
+        data = self.get(key, version)
+        if data is None:
+            with span(f"chart.render:{key[1]}"):
+                data = render_png(build_figure())
+            self.put(key, version, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+chart_cache = ChartCache()
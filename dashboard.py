@@ -1,27 +1,20 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-import os
-from matplotlib import ticker, font_manager, rcParams
-from db import get_connection
-from db import fetch_summary_data
+from matplotlib import ticker
+from datetime import datetime
+from db import (fetch_summary_page, delete_procedures, archive_year, archive_stats, archived_years, data_version,
+                fetch_step_lead_times)
+from chart_cache import chart_cache
+from period_query import fetch_period_rollup, fetch_site_names, fetch_years, fetch_months, ROLLUP_COLUMNS
+from startup import ensure_font
+from report_export import export_view
+from workflow import WORKFLOW
 
-# ✅ NanumGothicLight.ttf 폰트 로딩 (Streamlit Cloud 호환 방식)
-font_path = os.path.join(os.path.dirname(__file__), "assets", "NanumGothicLight.ttf")
-
-if os.path.exists(font_path):
-    try:
-        font_manager.fontManager.addfont(font_path)
-        font_name = font_manager.FontProperties(fname=font_path).get_name()
-        rcParams["font.family"] = font_name
-        st.write(f"✅ 한글 폰트 적용됨: {font_name}")
-    except Exception as e:
-        st.warning(f"⚠️ 폰트 적용 중 오류 발생: {e}")
-else:
-    st.warning("⚠️ 한글 폰트 파일을 찾을 수 없습니다. 기본 폰트를 사용합니다.")
-
-
-# 한글 폰트 설정
+GRAIN_OPTIONS = {"월": "month", "분기": "quarter", "연도": "year", "최근 12개월": "rolling12"}
+PAGE_SIZES = [25, 50, 100, 200]
+ALL = "전체"
 
 def format_unit(value):
     if value >= 1_0000_0000:
@@ -31,126 +24,338 @@ def format_unit(value):
     else:
         return value / 1_000, "천원", 1_000
 
-def summary_dashboard():
-    rows = fetch_summary_data()
-    if not rows:
-        st.info("📭 아직 입력된 비용 데이터가 없습니다.")
-        return
+AMOUNT_COLUMNS = ["기성금", "노무비", "투입비"]
+
 
-    df = pd.DataFrame(rows, columns=["현장명", "연도","월", "기성금", "노무비", "투입비"])
-    df = df.fillna(0)
-    df["투입비"] = df["투입비"].replace(0, 1)
+def safe_ratio(numerator, denominator):
+    """분모가 0인 항목은 NaN으로 두고 백분율을 계산합니다."""
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out * 100
+
+
+def summary_frame(rows):
+    """요약 행을 작은 dtype의 DataFrame 하나로 변환하고 비율 컬럼을 벡터 연산으로 추가합니다."""
+    n = len(rows)
+    sites, years, months, 기성금, 노무비, 투입비 = zip(*rows)
+    df = pd.DataFrame({
+        "현장명": pd.Categorical(sites),
+        "연도": np.fromiter(map(int, years), dtype=np.int16, count=n),
+        "월": np.fromiter(map(int, months), dtype=np.int8, count=n),
+        "기성금": np.fromiter((v or 0 for v in 기성금), dtype=np.int64, count=n),
+        "노무비": np.fromiter((v or 0 for v in 노무비), dtype=np.int64, count=n),
+        "투입비": np.fromiter((v or 0 for v in 투입비), dtype=np.int64, count=n),
+    })
     df["순수익"] = df["기성금"] - df["투입비"]
-    df["손익율"] = df["순수익"] / df["기성금"] * 100
-    df["노무비율"] = df["노무비"] / df["투입비"] * 100
+    df["손익율"] = safe_ratio(df["순수익"], df["기성금"])
+    df["노무비율"] = safe_ratio(df["노무비"], df["투입비"])
+    return df
 
-    st.markdown("### 📊 현장별 비용 리포트")
-    df_formatted = df.copy()
-    for col in ["기성금", "투입비", "노무비", "순수익"]:
-         df_formatted[col] = df_formatted[col].apply(lambda x: f"{int(x):,}")
-    df_formatted["손익율"] = df["손익율"].apply(lambda x: f"{x:.2f}%")
-    df_formatted["노무비율"] = df["노무비율"].apply(lambda x: f"{x:.2f}%")
-    df_formatted = df_formatted.rename(columns={"순수익": "현장손익(기성금-투입비)"})
-
-    st.dataframe(df_formatted, use_container_width=True)
-
-
-    # 삭제 기능 추가
-    delete_targets = df[["현장명", "월"]].drop_duplicates()
-    selected = st.selectbox("🗑️ 삭제할 (현장 + 월) 데이터 선택", delete_targets.apply(lambda r: f"{r['현장명']} - {r['월']}", axis=1))
-    if st.button("선택한 데이터 삭제"):
-        site, month = selected.split(" - ")
-        with get_connection() as conn:
-            conn.execute("DELETE FROM 절차상태 WHERE 현장명=? AND 월=?", (site, month))
-            conn.commit()
-        st.success(f"✅ {selected} 삭제 완료!")
+
+def _month_labels(months):
+    return months.astype(str).str.zfill(2)
+
+
+def _format_percent(values):
+    return values.map("{:.2f}%".format).where(values.notna(), "-")
+
+
+def format_summary(df):
+    """표시용 문자열 컬럼만 새로 만들어 반환합니다 (원본 DataFrame은 복사하지 않음)."""
+    return pd.DataFrame({
+        "현장명": df["현장명"],
+        "연도": df["연도"],
+        "월": _month_labels(df["월"]),
+        "기성금": df["기성금"].map("{:,}".format),
+        "노무비": df["노무비"].map("{:,}".format),
+        "투입비": df["투입비"].map("{:,}".format),
+        "현장손익(기성금-투입비)": df["순수익"].map("{:,}".format),
+        "손익율": _format_percent(df["손익율"]),
+        "노무비율": _format_percent(df["노무비율"]),
+    })
+
+
+def delete_view():
+    """삭제할 현장 → 연도 → 월을 차례로 필요한 만큼만 조회해서 고릅니다."""
+    sites = fetch_site_names()
+    if not sites:
+        st.info("삭제할 데이터가 없습니다.")
+        return
+    site = st.selectbox("🗑️ 삭제할 현장", sites, key="delete_site")
+    years = fetch_years(site)
+    if not years:
+        return
+    year = st.selectbox("연도", years, key="delete_year")
+    chosen = st.multiselect("삭제할 월 (비우면 연도 전체)", fetch_months(site, year), key="delete_months")
+    label = ", ".join(f"{m}월" for m in chosen) if chosen else "전체"
+    if st.button(f"선택한 데이터 삭제 ({site} {year}년 {label})"):
+        deleted = delete_procedures(site, year, chosen)
+        st.success(f"✅ {site} {year}년 {label} 삭제 완료! ({deleted}행)")
         st.rerun()
 
-    sites = df["현장명"].unique().tolist()
+
+def archive_view():
+    current_year = str(datetime.now().year)
+    closed = [y for y in fetch_years() if y < current_year]
+    if closed:
+        year = st.selectbox("보관할 마감 연도", closed, key="archive_year")
+        if st.button(f"📦 {year}년 보관 DB로 옮기기"):
+            try:
+                moved = archive_year(year)
+            except ValueError as e:
+                st.error(f"❌ {e}")
+            else:
+                st.success(f"✅ {year}년 {moved:,}행을 보관했습니다.")
+                st.rerun()
+    else:
+        st.info("보관할 마감 연도가 없습니다.")
+
+    stats = archive_stats()
+    if stats:
+        st.dataframe([{"연도": y, "경로": p, "행수": n, "보관시각": t} for y, p, n, t in stats],
+                     use_container_width=True, hide_index=True)
+
+
+def _move_page(cursors, cursor):
+    # cursors: 지금까지 지나온 페이지의 시작 키 목록 (이전 페이지로 돌아갈 때 사용)
+    if cursor is None:
+        cursors.pop()
+    else:
+        cursors.append(cursor)
+
+
+@st.fragment
+def report_table(sites, include_archived):
+    """필터와 키셋 페이지네이션으로 현재 페이지의 행만 조회해 표시합니다."""
+    col1, col2, col3 = st.columns(3)
+    site = col1.selectbox("현장", [ALL, *sites], key="report_site")
+    site = None if site == ALL else site
+    year = col2.selectbox("연도", [ALL, *fetch_years(site, include_archived)], key="report_year")
+    year = None if year == ALL else year
+    page_size = col3.selectbox("페이지당 행 수", PAGE_SIZES, index=1, key="report_page_size")
+
+    # 필터가 바뀌면 첫 페이지부터
+    filters = (site, year, page_size, include_archived)
+    if st.session_state.get("report_filters") != filters:
+        st.session_state.report_filters = filters
+        st.session_state.report_cursors = [None]
+    cursors = st.session_state.report_cursors
+
+    rows = fetch_summary_page(site, year, cursors[-1], page_size + 1, include_archived)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    if not rows:
+        st.info("조건에 맞는 데이터가 없습니다.")
+        return
+
+    st.dataframe(format_summary(summary_frame(rows)), use_container_width=True, hide_index=True)
+
+    prev_col, info_col, next_col = st.columns([1, 2, 1])
+    prev_col.button("◀ 이전", key="report_prev", disabled=len(cursors) == 1,
+                    on_click=_move_page, args=(cursors, None))
+    info_col.caption(f"{len(cursors)} 페이지 · {len(rows)}행")
+    next_col.button("다음 ▶", key="report_next", disabled=not has_next,
+                    on_click=_move_page, args=(cursors, tuple(rows[-1][:3])))
+
+
+def summary_dashboard():
+    _, font_error = ensure_font()
+    if font_error:
+        st.warning(f"⚠️ {font_error}")
+
+    include_archived = bool(archived_years()) and st.checkbox("🧊 보관된 연도 포함", key="dashboard_archived")
+    sites = fetch_site_names(include_archived)
     if not sites:
-        st.warning("선택할 수 있는 현장 데이터가 없습니다.")
+        st.info("📭 아직 입력된 비용 데이터가 없습니다.")
         return
 
+    st.markdown("### 📊 현장별 비용 리포트")
+    report_table(sites, include_archived)
+
+    maintenance_section()
+    with st.expander("📤 리포트 내보내기 (CSV / XLSX / PDF)"):
+        export_view(sites)
+
+    site_report(sites, include_archived)
+    lead_time_section()
+
+
+@st.fragment
+def maintenance_section():
+    # 삭제 대상은 열었을 때만 조회
+    if st.toggle("🗑️ 데이터 삭제", key="delete_open"):
+        delete_view()
+    if st.session_state.get("role") == "관리자":
+        with st.expander("🧊 연도 보관"):
+            archive_view()
+
+
+@st.fragment
+def site_report(sites, include_archived):
+    """현장별 요약 수치와 차트. 현장·집계 단위·차트 선택은 이 부분만 다시 실행합니다."""
     selected_site = st.selectbox("📍 리포트 확인할 현장 선택", sites, key="dashboard_site")
-    df_site = df[df["현장명"] == selected_site]
+    grain_label = st.radio("📆 집계 단위", list(GRAIN_OPTIONS), horizontal=True, key="dashboard_grain")
+    grain = GRAIN_OPTIONS[grain_label]
+
+    # 선택한 현장의 기간별 집계·누계를 SQL에서 계산해 차트에 필요한 행만 받음
+    df_site = pd.DataFrame(fetch_period_rollup(selected_site, grain, include_archived=include_archived), columns=ROLLUP_COLUMNS)
 
     if df_site.empty:
         st.warning("선택된 현장에 대한 데이터가 없습니다.")
         return
 
+    df_site["순수익"] = df_site["기성금"] - df_site["투입비"]
+
     with st.expander("📌 요약 수치 보기", expanded=True):
-        total_기성금 = df_site["기성금"].sum()
-        total_투입비 = df_site["투입비"].sum()
-        total_노무비 = df_site["노무비"].sum()
+        last = df_site.iloc[-1]
+        total_기성금 = last["기성금누계"]
+        total_투입비 = last["투입비누계"]
+        total_노무비 = last["노무비누계"]
+        if grain == "rolling12":
+            total_기성금, total_투입비, total_노무비 = last["기성금"], last["투입비"], last["노무비"]
         total_손익 = total_기성금 - total_투입비
         비율 = (total_투입비 / total_기성금 * 100) if total_기성금 != 0 else 0
 
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("기성금 누계", f"{int(total_기성금):,}원")
+        전년 = last["전년기성금"]
+        yoy = f"전년 동기 대비 {(last['기성금'] - 전년) / 전년 * 100:+.1f}%" if pd.notna(전년) and 전년 != 0 else None
+        col1.metric("기성금 누계", f"{int(total_기성금):,}원", yoy)
         col2.metric("투입비 누계", f"{int(total_투입비):,}원", f"{비율:.1f}%")
         col3.metric("노무비 누계", f"{int(total_노무비):,}원")
         col4.metric("현장손익 누계", f"{int(total_손익):,}원")
 
-    # 월별 비용 추이
-    st.subheader("📈 월별 비용 추이")
+    version = data_version()
+    archived_key = "archived" if include_archived else "hot"
+    charts = [
+        # (종류, 제목, 그림 함수) — 켠 차트만 그리거나 캐시에서 꺼냄
+        ("trend", f"📈 {grain_label}별 비용 추이", lambda: _trend_figure(df_site)),
+        ("cumulative", f"📈 {grain_label}별 누계 그래프", lambda: _cumulative_figure(df_site)),
+        ("margin", f"📈 {grain_label}별 손익율 그래프", lambda: _margin_figure(df_site, grain_label)),
+    ]
+    for kind, title, build in charts:
+        if st.toggle(title, key=f"chart_{kind}"):
+            st.image(chart_cache.get_or_render(
+                (selected_site, kind, grain, archived_key), version, build))
+
+
+def format_duration(seconds):
+    if seconds is None or pd.isna(seconds):
+        return "-"
+    if seconds >= 86400:
+        return f"{seconds / 86400:.1f}일"
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}시간"
+    return f"{seconds / 60:.0f}분"
+
+
+@st.fragment
+def lead_time_section():
+    """부서·단계별 소요 시간과 현재 대기 건수. 단계 전이 때 갱신되는 집계만 읽습니다."""
+    if not st.toggle("⏳ 단계 소요 시간·병목 보기", key="lead_time_open"):
+        return
+    rows = fetch_step_lead_times()
+    if not rows:
+        st.info("아직 기록된 단계 전이가 없습니다.")
+        return
+
+    df = pd.DataFrame(rows, columns=["비용유형", "단계번호", "담당부서", "완료수", "평균초", "최대초", "대기", "최초시작"])
+    now = datetime.now().timestamp()
+    df["최장대기초"] = now - df["최초시작"]
+    df["합계초"] = df["평균초"].fillna(0) * df["완료수"]
+
+    by_dept = df.groupby("담당부서").agg(완료수=("완료수", "sum"), 합계초=("합계초", "sum"),
+                                         최대초=("최대초", "max"), 대기=("대기", "sum"),
+                                         최장대기초=("최장대기초", "max")).reset_index()
+    by_dept["평균초"] = by_dept["합계초"] / by_dept["완료수"].replace(0, np.nan)
+    by_dept = by_dept.sort_values(["대기", "최장대기초"], ascending=False)
+
+    st.markdown("#### 🏢 부서별")
+    cols = st.columns(len(by_dept))
+    for col, (_, row) in zip(cols, by_dept.iterrows()):
+        col.metric(row["담당부서"], f"대기 {int(row['대기'])}건", f"평균 {format_duration(row['평균초'])}",
+                   delta_color="off")
+    st.dataframe(pd.DataFrame({
+        "담당부서": by_dept["담당부서"],
+        "완료": by_dept["완료수"],
+        "평균 소요": by_dept["평균초"].map(format_duration),
+        "최대 소요": by_dept["최대초"].map(format_duration),
+        "현재 대기": by_dept["대기"],
+        "최장 대기": by_dept["최장대기초"].map(format_duration),
+    }), use_container_width=True, hide_index=True)
+
+    # 대기 건수 × 평균 소요가 큰 단계부터 = 병목
+    st.markdown("#### 🚧 단계별 (병목 순)")
+    df["병목"] = df["대기"] * df["평균초"].fillna(df["최장대기초"]).fillna(0)
+    df = df.sort_values(["병목", "대기"], ascending=False)
+    st.dataframe(pd.DataFrame({
+        "비용유형": df["비용유형"],
+        "단계": [f"{no}. {WORKFLOW.step(ct, no).task}" if no <= len(WORKFLOW.steps.get(ct, ())) else str(no)
+                 for ct, no in zip(df["비용유형"], df["단계번호"])],
+        "담당부서": df["담당부서"],
+        "완료": df["완료수"],
+        "평균 소요": df["평균초"].map(format_duration),
+        "최대 소요": df["최대초"].map(format_duration),
+        "현재 대기": df["대기"],
+        "최장 대기": df["최장대기초"].map(format_duration),
+    }), use_container_width=True, hide_index=True)
+
+
+def _trend_figure(df_site):
     fig1, ax1 = plt.subplots(figsize=(6, 2))
     max1 = df_site[["기성금", "투입비", "노무비"]].values.max()
     _, unit_label1, unit_div1 = format_unit(max1)
-    df_plot1 = df_site.copy()
-    df_plot1[["기성금", "투입비", "노무비"]] /= unit_div1
+    df_plot1 = df_site.set_index("기간")[["기성금", "투입비", "노무비"]] / unit_div1
 
-    df_plot1.set_index("월")[["기성금", "투입비", "노무비"]].plot(kind="bar", ax=ax1)
+    df_plot1.plot(kind="bar", ax=ax1)
     ax1.set_ylabel(f"금액 ({unit_label1})")
     ax1.set_title("기성금 / 투입비 / 노무비", fontsize=12)
     ax1.legend(title="비용항목", labels=["기성금", "투입비", "노무비"], fontsize=9, title_fontsize=10)
-    ax1.set_xticklabels(df_plot1["월"], rotation=0)
+    ax1.set_xticklabels(df_plot1.index, rotation=0)
     ax1.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{x:.1f}"))
     ax1.yaxis.grid(True, linestyle="--", alpha=0.3)
-    st.pyplot(fig1)
+    return fig1
 
-    # 월별 누계 그래프
-    st.subheader("📈 월별 누계 그래프")
-    df_cumsum = df_site.sort_values("월").copy()
-    df_cumsum[["기성금", "투입비", "노무비"]] = df_cumsum[["기성금", "투입비", "노무비"]].cumsum()
 
-    last = df_cumsum.iloc[-1]
-    rate1 = last["투입비"] / last["기성금"] * 100 if last["기성금"] != 0 else 0
-    rate2 = last["노무비"] / last["투입비"] * 100 if last["투입비"] != 0 else 0
+def _cumulative_figure(df_site):
+    cum_cols = ["기성금누계", "투입비누계", "노무비누계"]
+    last = df_site.iloc[-1]
+    rate1 = last["투입비누계"] / last["기성금누계"] * 100 if last["기성금누계"] != 0 else 0
+    rate2 = last["노무비누계"] / last["투입비누계"] * 100 if last["투입비누계"] != 0 else 0
 
     fig2, ax2 = plt.subplots(figsize=(6, 2))
-    max2 = df_cumsum[["기성금", "투입비", "노무비"]].values.max()
+    max2 = df_site[cum_cols].values.max()
     _, unit_label2, unit_div2 = format_unit(max2)
-    df_plot2 = df_cumsum.copy()
-    df_plot2[["기성금", "투입비", "노무비"]] /= unit_div2
+    df_plot2 = df_site[["기간"] + cum_cols].copy()
+    df_plot2[cum_cols] /= unit_div2
+    df_plot2.columns = ["기간", "기성금", "투입비", "노무비"]
 
-    df_plot2.plot(x="월", y=["기성금", "투입비", "노무비"], kind="line", marker="o", ax=ax2)
+    df_plot2.plot(x="기간", y=["기성금", "투입비", "노무비"], kind="line", marker="o", ax=ax2)
     ax2.set_title("기성금 / 투입비 / 노무비 누계")
     ax2.set_ylabel(f"금액 ({unit_label2})")
     ax2.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{x:.1f}"))
     ax2.legend(title="누계 항목")
     ax2.yaxis.grid(True, linestyle="--", alpha=0.3)
-    ax2.text(x=len(df_cumsum)-1.1, y=df_plot2["투입비"].iloc[-1], s=f"투입비/기성금: {rate1:.1f}%", fontsize=8, color="black")
-    ax2.text(x=len(df_cumsum)-1.1, y=df_plot2["노무비"].iloc[-1], s=f"노무비/투입비: {rate2:.1f}%", fontsize=8, color="black")
-    st.pyplot(fig2)
+    ax2.text(x=len(df_plot2)-1.1, y=df_plot2["투입비"].iloc[-1], s=f"투입비/기성금: {rate1:.1f}%", fontsize=8, color="black")
+    ax2.text(x=len(df_plot2)-1.1, y=df_plot2["노무비"].iloc[-1], s=f"노무비/투입비: {rate2:.1f}%", fontsize=8, color="black")
+    return fig2
 
-    # 월별 손익율 그래프
-    st.subheader("📈 월별 손익율 그래프")
-    df_site = df_site.sort_values("월").copy()
-    max_val = df_site["순수익"].max()
-    _, unit_label3, unit_div3 = format_unit(max_val)
+
+def _margin_figure(df_site, grain_label):
+    margin = safe_ratio(df_site["순수익"], df_site["기성금"])
 
     fig3, ax3 = plt.subplots(figsize=(6, 2))
-    df_site["손익율"] = df_site["순수익"] / df_site["기성금"] * 100
-    df_site.plot(x="월", y="손익율", kind="line", marker="s", color="purple", ax=ax3, label="손익율")
+    ax3.plot(df_site["기간"], margin, marker="s", color="purple", label="손익율")
+    ax3.legend()
+    ax3.set_xlabel("기간")
     ax3.set_ylabel("손익율 (%)")
-    ax3.set_title("월별 손익율")
+    ax3.set_title(f"{grain_label}별 손익율")
     ax3.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{x:.1f}"))
     ax3.yaxis.grid(True, linestyle="--", alpha=0.3)
 
-    for i, row in df_site.iterrows():
-        x = row["월"]
-        y = row["손익율"]
-        ax3.text(i, y, f"{y:.1f}%", fontsize=8, color="black", ha="center", va="bottom")
-
-    st.pyplot(fig3)
+    for i, y in enumerate(margin):
+        if not np.isnan(y):
+            ax3.text(i, y, f"{y:.1f}%", fontsize=8, color="black", ha="center", va="bottom")
 
+    return fig3
@@ -1,121 +1,1325 @@
+import json
+import os
 import sqlite3
+import threading
+import time
+import queue
+import urllib.parse
+from collections import OrderedDict
 from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+from profiling import timed
+from workflow import WORKFLOW
+
+DB_PATH = os.environ.get("SITE_COST_DB", "database.db")
+# 마감 연도를 옮겨 두는 연도별 보관 DB 폴더 (기본: 운영 DB 옆 archive/)
+ARCHIVE_DIR = os.environ.get(
+    "SITE_COST_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "archive")
+)
+
+# --- 🔌 커넥션 풀 설정 ---
+POOL_SIZE = 4
+POOL_TIMEOUT = 10.0          # 커넥션 대기 최대 시간(초)
+BUSY_TIMEOUT_MS = 5000
+BUSY_RETRIES = 3
+STATEMENT_CACHE_SIZE = 256
+
+_pool = queue.LifoQueue()
+_pool_lock = threading.Lock()
+_pool_created = 0
+_statement_tracer = None
+_conn_tracers = {}          # id(conn) → 해당 커넥션에 설정된 tracer
+_pool_stats = {
+    "checkouts": 0,
+    "wait_time": 0.0,
+    "max_wait": 0.0,
+    "busy_retries": 0,
+    "connections": 0,
+}
+
+
+def _open_connection():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-8000")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _checkout():
+    global _pool_created
+    start = time.perf_counter()
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = None
+        with _pool_lock:
+            if _pool_created < POOL_SIZE:
+                _pool_created += 1
+                _pool_stats["connections"] = _pool_created
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                conn = _open_connection()
+            except Exception:
+                with _pool_lock:
+                    _pool_created -= 1
+                    _pool_stats["connections"] = _pool_created
+                raise
+        else:
+            try:
+                conn = _pool.get(timeout=POOL_TIMEOUT)
+            except queue.Empty:
+                raise sqlite3.OperationalError("커넥션 풀 대기 시간 초과")
+
+    if _conn_tracers.get(id(conn)) is not _statement_tracer:
+        conn.set_trace_callback(_statement_tracer)
+        _conn_tracers[id(conn)] = _statement_tracer
+
+    waited = time.perf_counter() - start
+    with _pool_lock:
+        _pool_stats["checkouts"] += 1
+        _pool_stats["wait_time"] += waited
+        _pool_stats["max_wait"] = max(_pool_stats["max_wait"], waited)
+    return conn
+
+
+def _checkin(conn):
+    global _pool_created
+    # 커밋되지 않은 작업은 기존 close() 동작과 같게 롤백한 뒤 반납
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        _conn_tracers.pop(id(conn), None)
+        with _pool_lock:
+            _pool_created -= 1
+            _pool_stats["connections"] = _pool_created
+        return
+    _pool.put(conn)
 
-DB_PATH = "database.db"
 
 @contextmanager
 def get_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = _checkout()
     try:
         yield conn
     finally:
+        _checkin(conn)
+
+
+@contextmanager
+def write_transaction():
+    """BEGIN IMMEDIATE로 쓰기 잠금을 먼저 잡고 짧게 끝내는 쓰기 트랜잭션."""
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+class VersionConflict(Exception):
+    """다른 세션이 먼저 같은 행을 변경해서 비교 후 교체(CAS)가 실패한 경우."""
+
+
+def _is_busy_error(e):
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def retry_on_busy(func):
+    """SQLITE_BUSY/locked 오류 시 짧게 대기 후 재시도합니다."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt == BUSY_RETRIES or not _is_busy_error(e):
+                    raise
+                with _pool_lock:
+                    _pool_stats["busy_retries"] += 1
+                time.sleep(0.05 * (2 ** attempt))
+    return wrapper
+
+
+def set_statement_tracer(callback):
+    """풀의 모든 커넥션에서 실행되는 SQL 문마다 callback(sql)을 호출합니다. None이면 해제."""
+    global _statement_tracer
+    _statement_tracer = callback
+
+
+def pool_stats():
+    """커넥션 풀 사용 지표 (체크아웃 수, 누적/최대 대기 시간, busy 재시도 수)."""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+    stats["idle"] = _pool.qsize()
+    stats["avg_wait_ms"] = (stats["wait_time"] / stats["checkouts"] * 1000) if stats["checkouts"] else 0.0
+    return stats
+
+
+def close_pool():
+    global _pool_created
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            break
         conn.close()
+        _conn_tracers.pop(id(conn), None)
+        with _pool_lock:
+            _pool_created -= 1
+            _pool_stats["connections"] = _pool_created
+
+# --- 🔢 데이터 버전: 절차상태를 바꾸는 쓰기마다 증가 (캐시 무효화용) ---
+_data_version = 0
+_version_lock = threading.Lock()
+
+
+def bump_data_version():
+    global _data_version
+    with _version_lock:
+        _data_version += 1
+        return _data_version
+
+
+def data_version():
+    return _data_version
+
+
+# --- 🧠 조회 결과 캐시 (세션 간 공유, 데이터 버전 + TTL로 무효화) ---
+QUERY_CACHE_TTL = 30.0
+QUERY_CACHE_MAX_ENTRIES = 256
+
+_query_cache = OrderedDict()   # 키 → (데이터 버전, 만료 시각, 결과, 조회 소요 시간)
+_query_cache_lock = threading.Lock()
+_query_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "query_time": 0.0, "saved_time": 0.0}
+
+
+def cached_query(ttl=QUERY_CACHE_TTL):
+    """읽기 전용 조회 함수의 결과를 (함수, 인자) 단위로 캐시합니다.
+
+    쓰기 경로가 bump_data_version()을 호출하면 이전 결과는 더 이상 사용되지 않습니다.
+    결과 행 목록은 복사본으로 돌려주므로 호출 측에서 수정해도 캐시에 영향이 없습니다.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            version = _data_version
+            now = time.monotonic()
+            with _query_cache_lock:
+                entry = _query_cache.get(key)
+                if entry and entry[0] == version and entry[1] > now:
+                    _query_cache.move_to_end(key)
+                    _query_cache_stats["hits"] += 1
+                    _query_cache_stats["saved_time"] += entry[3]
+                    return list(entry[2])
+
+            start = time.perf_counter()
+            rows = tuple(func(*args, **kwargs))
+            elapsed = time.perf_counter() - start
+
+            with _query_cache_lock:
+                _query_cache_stats["misses"] += 1
+                _query_cache_stats["query_time"] += elapsed
+                _query_cache[key] = (version, now + ttl, rows, elapsed)
+                _query_cache.move_to_end(key)
+                while len(_query_cache) > QUERY_CACHE_MAX_ENTRIES:
+                    _query_cache.popitem(last=False)
+                    _query_cache_stats["evictions"] += 1
+            return list(rows)
+        return wrapper
+    return decorator
+
+
+def query_cache_stats():
+    with _query_cache_lock:
+        stats = dict(_query_cache_stats)
+        stats["entries"] = len(_query_cache)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] / total) if total else 0.0
+    return stats
+
+
+def clear_query_cache():
+    with _query_cache_lock:
+        _query_cache.clear()
+
+
+# 보관 DB도 같은 정의로 만들기 위해 스키마 이름만 바꿔 씀 ("" 또는 "arc.")
+_STEP_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {schema}절차상태 (
+        현장명 TEXT,
+        연도 TEXT,
+        월 TEXT,
+        비용유형 TEXT,
+        단계번호 INTEGER,
+        작업내용 TEXT,
+        담당부서 TEXT,
+        상태 TEXT DEFAULT '진행중',
+        -- 금액 컬럼은 이전 데이터 호환용. 금액은 비용원장에 기록되며 이전 후 이 컬럼들은 0
+        기성금 INTEGER DEFAULT 0,
+        노무비 INTEGER DEFAULT 0,
+        투입비 INTEGER DEFAULT 0,
+        버전 INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (현장명, 연도, 월, 비용유형, 단계번호)
+    )
+'''
+
+_STATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {schema}절차진행상태 (
+        키 TEXT PRIMARY KEY,
+        상태 TEXT NOT NULL,
+        수정시각 TEXT DEFAULT CURRENT_TIMESTAMP,
+        버전 INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+AMOUNT_COLUMNS = ("기성금", "노무비", "투입비")
 
+# 금액 한 건 = 한 행 (추가 전용). 정정·부분 입력도 차액 행을 추가해 기록함
+_LEDGER_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {schema}비용원장 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        현장명 TEXT NOT NULL,
+        연도 TEXT NOT NULL,
+        월 TEXT NOT NULL,
+        비용유형 TEXT NOT NULL,
+        단계번호 INTEGER NOT NULL,
+        비용항목 TEXT NOT NULL CHECK (비용항목 IN ('기성금', '노무비', '투입비')),
+        금액 INTEGER NOT NULL,
+        입력자 TEXT NOT NULL DEFAULT '',
+        입력시각 REAL NOT NULL
+    )
+'''
+
+_SUMMARY_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {schema}월별요약 (
+        현장명 TEXT,
+        연도 TEXT,
+        월 TEXT,
+        비용유형 TEXT,
+        행수 INTEGER NOT NULL DEFAULT 0,
+        기성금 INTEGER NOT NULL DEFAULT 0,
+        노무비 INTEGER NOT NULL DEFAULT 0,
+        투입비 INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (현장명, 연도, 월, 비용유형)
+    ) WITHOUT ROWID
+'''
+
+
+@timed("db.init_db")
+@retry_on_busy
 def init_db():
     with get_connection() as conn:
+        conn.execute(_STEP_TABLE_SQL.format(schema=""))
+        conn.execute(_STATE_TABLE_SQL.format(schema=""))
+        for table in ("절차상태", "절차진행상태"):
+            _add_column_if_missing(conn, table, "버전", "INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_절차상태_담당부서_상태 ON 절차상태 (담당부서, 상태)")
+        _backfill_step_meta(conn)
         conn.execute('''
-            CREATE TABLE IF NOT EXISTS 절차상태 (
-                현장명 TEXT,
-                연도 TEXT,
-                월 TEXT,
-                비용유형 TEXT,
-                단계번호 INTEGER,
-                작업내용 TEXT,
-                담당부서 TEXT,
-                상태 TEXT DEFAULT '진행중',
-                기성금 INTEGER DEFAULT 0,
-                노무비 INTEGER DEFAULT 0,
-                투입비 INTEGER DEFAULT 0,
-                PRIMARY KEY (현장명, 연도, 월, 비용유형, 단계번호)
+            CREATE TABLE IF NOT EXISTS 메타정보 (
+                키 TEXT PRIMARY KEY,
+                값 TEXT
             )
         ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS 보관연도 (
+                연도 TEXT PRIMARY KEY,
+                경로 TEXT NOT NULL,
+                행수 INTEGER NOT NULL,
+                보관시각 TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        _create_step_events(conn)
+        _create_cost_ledger(conn)
+        summary_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='월별요약'"
+        ).fetchone()
+        _create_monthly_summary(conn)
+        if not summary_exists:
+            _rebuild_monthly_summary(conn)
+        if not conn.execute("SELECT 1 FROM 메타정보 WHERE 키='cost_ledger_migrated'").fetchone():
+            _migrate_amounts_to_ledger(conn)
+            conn.execute("INSERT OR REPLACE INTO 메타정보 (키, 값) VALUES ('cost_ledger_migrated', ?)",
+                         (datetime.now().isoformat(timespec="seconds"),))
         conn.commit()
 
-def insert_initial_steps(site, year, month, cost_type, step_list):
-    month = f"{int(month):02d}"
+
+def _step_meta(cost_type, step_no):
+    """절차 정의에서 (작업내용, 담당부서)를 찾습니다. 정의에 없는 단계는 빈 값."""
+    steps = WORKFLOW.steps.get(cost_type, ())
+    if 1 <= step_no <= len(steps):
+        step = steps[step_no - 1]
+        return step.task, step.dept
+    return "", ""
+
+
+def _backfill_step_meta(conn):
+    # 빈 작업내용/담당부서로 만들어진 이전 행을 절차 정의로 채움 (부서별 작업함 조회용)
+    conn.executemany('''
+        UPDATE 절차상태 SET 작업내용=?, 담당부서=?
+        WHERE 비용유형=? AND 단계번호=? AND 담당부서=''
+    ''', [(s.task, s.dept, s.cost_type, s.no) for steps in WORKFLOW.steps.values() for s in steps])
+
+
+def _add_column_if_missing(conn, table, column, ddl):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
+# --- 📅 월별요약: 절차 행 수와 비용원장 금액 합계를 트리거로 유지하는 집계 테이블 ---
+_SUMMARY_ADD = '''
+    INSERT INTO 월별요약 (현장명, 연도, 월, 비용유형, 행수, 기성금, 노무비, 투입비)
+    VALUES (NEW.현장명, NEW.연도, NEW.월, NEW.비용유형, 1, 0, 0, 0)
+    ON CONFLICT(현장명, 연도, 월, 비용유형) DO UPDATE SET 행수 = 행수 + 1;
+'''
+
+_SUMMARY_SUB = '''
+    UPDATE 월별요약 SET 행수 = 행수 - 1
+    WHERE 현장명=OLD.현장명 AND 연도=OLD.연도 AND 월=OLD.월 AND 비용유형=OLD.비용유형;
+    DELETE FROM 월별요약
+    WHERE 현장명=OLD.현장명 AND 연도=OLD.연도 AND 월=OLD.월 AND 비용유형=OLD.비용유형
+      AND 행수 <= 0;
+'''
+
+_LEDGER_AMOUNTS = '''
+    CASE {row}.비용항목 WHEN '기성금' THEN {row}.금액 ELSE 0 END,
+    CASE {row}.비용항목 WHEN '노무비' THEN {row}.금액 ELSE 0 END,
+    CASE {row}.비용항목 WHEN '투입비' THEN {row}.금액 ELSE 0 END
+'''
+
+_LEDGER_SUMMARY_ADD = f'''
+    INSERT INTO 월별요약 (현장명, 연도, 월, 비용유형, 행수, 기성금, 노무비, 투입비)
+    VALUES (NEW.현장명, NEW.연도, NEW.월, NEW.비용유형, 0, {_LEDGER_AMOUNTS.format(row="NEW")})
+    ON CONFLICT(현장명, 연도, 월, 비용유형) DO UPDATE SET
+        기성금 = 기성금 + excluded.기성금,
+        노무비 = 노무비 + excluded.노무비,
+        투입비 = 투입비 + excluded.투입비;
+'''
+
+_LEDGER_SUMMARY_SUB = '''
+    UPDATE 월별요약 SET
+        기성금 = 기성금 - CASE OLD.비용항목 WHEN '기성금' THEN OLD.금액 ELSE 0 END,
+        노무비 = 노무비 - CASE OLD.비용항목 WHEN '노무비' THEN OLD.금액 ELSE 0 END,
+        투입비 = 투입비 - CASE OLD.비용항목 WHEN '투입비' THEN OLD.금액 ELSE 0 END
+    WHERE 현장명=OLD.현장명 AND 연도=OLD.연도 AND 월=OLD.월 AND 비용유형=OLD.비용유형;
+'''
+
+def _create_monthly_summary(conn):
+    # 기본키 (현장명, 연도, 월, 비용유형)가 현장·기간 조회용 인덱스 역할을 겸함
+    # 행수는 절차상태 행, 금액은 비용원장 행이 추가·삭제될 때 반영됨
+    conn.execute(_SUMMARY_TABLE_SQL.format(schema=""))
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_월별요약_원장_insert AFTER INSERT ON 비용원장 BEGIN {_LEDGER_SUMMARY_ADD} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_월별요약_원장_delete AFTER DELETE ON 비용원장 BEGIN {_LEDGER_SUMMARY_SUB} END")
+    # 금액 컬럼까지 더하던 이전 트리거를 행수만 세는 정의로 교체
+    for name, event, body in (("insert", "INSERT", _SUMMARY_ADD), ("delete", "DELETE", _SUMMARY_SUB)):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_월별요약_{name}")
+        conn.execute(f"CREATE TRIGGER trg_월별요약_{name} AFTER {event} ON 절차상태 BEGIN {body} END")
+    # 절차상태 금액 컬럼은 더 이상 갱신하지 않음. 남겨 두면 행 하나뿐인 요약을 지웠다 다시 만들며 원장 금액을 잃음
+    conn.execute("DROP TRIGGER IF EXISTS trg_월별요약_update")
+
+# 운영 DB 금액은 비용원장에서만 집계. 보관 DB에는 비용원장 이전 전의 금액 컬럼 값이 남아 있을 수 있어
+# 보관 DB를 집계할 때만 _COLUMN_AMOUNTS로 두 곳을 모두 합산
+_COLUMN_AMOUNTS = "IFNULL(기성금, 0) AS 기성금, IFNULL(노무비, 0) AS 노무비, IFNULL(투입비, 0) AS 투입비"
+_LEDGER_ONLY = "0 AS 기성금, 0 AS 노무비, 0 AS 투입비"
+
+_SUMMARY_SOURCE_SQL = f'''
+    SELECT 현장명, 연도, 월, 비용유형, SUM(행수), SUM(기성금), SUM(노무비), SUM(투입비)
+    FROM (
+        SELECT 현장명, 연도, 월, 비용유형, 1 AS 행수, {{amounts}}
+        FROM {{schema}}절차상태
+        UNION ALL
+        SELECT 현장명, 연도, 월, 비용유형, 0, {_LEDGER_AMOUNTS.format(row="l")}
+        FROM {{schema}}비용원장 AS l
+    )
+    GROUP BY 현장명, 연도, 월, 비용유형
+'''
+
+def _rebuild_monthly_summary(conn):
+    conn.execute("DELETE FROM 월별요약")
+    conn.execute(f"INSERT INTO 월별요약 {_SUMMARY_SOURCE_SQL.format(schema='', amounts=_LEDGER_ONLY)}")
+
+# --- 🕒 단계이벤트: 단계 전이 기록(추가 전용)과 트리거로 유지하는 소요 시간 집계 ---
+# 이벤트: '시작'(담당 단계가 됨), '완료', '초기화'(절차 전체를 1단계로 되돌림, 단계번호 0)
+_STEP_OPEN_KEY = "현장명=NEW.현장명 AND 연도=NEW.연도 AND 월=NEW.월 AND 비용유형=NEW.비용유형"
+
+_STEP_EVENT_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {schema}단계이벤트 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        현장명 TEXT NOT NULL,
+        연도 TEXT NOT NULL,
+        월 TEXT NOT NULL,
+        비용유형 TEXT NOT NULL,
+        단계번호 INTEGER NOT NULL,
+        담당부서 TEXT NOT NULL,
+        이벤트 TEXT NOT NULL,
+        시각 REAL NOT NULL
+    )
+'''
+
+def _create_step_events(conn):
+    conn.execute(_STEP_EVENT_TABLE_SQL.format(schema=""))
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_단계이벤트_절차
+        ON 단계이벤트 (현장명, 연도, 월, 비용유형, 시각)
+    ''')
+    # 지금 진행중인 단계와 시작 시각 (병목 조회용)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS 단계진행중 (
+            현장명 TEXT,
+            연도 TEXT,
+            월 TEXT,
+            비용유형 TEXT,
+            단계번호 INTEGER,
+            담당부서 TEXT NOT NULL,
+            시작시각 REAL NOT NULL,
+            PRIMARY KEY (현장명, 연도, 월, 비용유형, 단계번호)
+        ) WITHOUT ROWID
+    ''')
+    # 단계별 완료 건수와 소요 시간 합계·최대 (이벤트가 쌓일 때마다 갱신)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS 단계소요통계 (
+            비용유형 TEXT,
+            단계번호 INTEGER,
+            담당부서 TEXT NOT NULL,
+            완료수 INTEGER NOT NULL DEFAULT 0,
+            합계초 REAL NOT NULL DEFAULT 0,
+            최대초 REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (비용유형, 단계번호)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_단계이벤트_시작
+        AFTER INSERT ON 단계이벤트 WHEN NEW.이벤트 = '시작'
+        BEGIN
+            INSERT OR IGNORE INTO 단계진행중 (현장명, 연도, 월, 비용유형, 단계번호, 담당부서, 시작시각)
+            VALUES (NEW.현장명, NEW.연도, NEW.월, NEW.비용유형, NEW.단계번호, NEW.담당부서, NEW.시각);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_단계이벤트_완료
+        AFTER INSERT ON 단계이벤트 WHEN NEW.이벤트 = '완료'
+        BEGIN
+            INSERT INTO 단계소요통계 (비용유형, 단계번호, 담당부서, 완료수, 합계초, 최대초)
+            SELECT NEW.비용유형, NEW.단계번호, NEW.담당부서, 1, NEW.시각 - 시작시각, NEW.시각 - 시작시각
+            FROM 단계진행중 WHERE {_STEP_OPEN_KEY} AND 단계번호=NEW.단계번호
+            ON CONFLICT(비용유형, 단계번호) DO UPDATE SET
+                완료수 = 완료수 + 1,
+                합계초 = 합계초 + excluded.합계초,
+                최대초 = MAX(최대초, excluded.최대초);
+            DELETE FROM 단계진행중 WHERE {_STEP_OPEN_KEY} AND 단계번호=NEW.단계번호;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_단계이벤트_초기화
+        AFTER INSERT ON 단계이벤트 WHEN NEW.이벤트 = '초기화'
+        BEGIN
+            DELETE FROM 단계진행중 WHERE {_STEP_OPEN_KEY};
+        END
+    ''')
+
+def _log_step_events(conn, events):
+    """(현장명, 연도, 월, 비용유형, 단계번호, 이벤트) 목록을 단계이벤트에 추가합니다."""
+    now = time.time()
+    conn.executemany('''
+        INSERT INTO 단계이벤트 (현장명, 연도, 월, 비용유형, 단계번호, 담당부서, 이벤트, 시각)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(*cell, _step_meta(cell[3], cell[4])[1], event, now) for *cell, event in events])
+
+def _status_events(conn, cells):
+    """{셀: 새 상태} 중 DB 상태와 달라지는 셀의 이벤트 목록 (완료 → '완료', 완료에서 되돌림 → '시작')."""
+    events = []
+    for cell, 상태 in cells.items():
+        row = conn.execute(f"SELECT 상태 FROM 절차상태 WHERE {_STEP_WHERE}", cell).fetchone()
+        current = row[0] if row else None
+        if 상태 == "완료" and current != "완료":
+            events.append((*cell, "완료"))
+        elif 상태 != "완료" and current == "완료":
+            events.append((*cell, "시작"))
+    return events
+
+@timed("db.record_step_events")
+@retry_on_busy
+def record_step_events(events):
+    """절차 시작(1단계 '시작')이나 초기화('초기화', 단계번호 0)처럼 절차상태 행 밖의 전이를 기록합니다.
+
+    events: (현장명, 연도, 월, 비용유형, 단계번호, 이벤트) 목록
+    """
+    with write_transaction() as conn:
+        _log_step_events(conn, [(site, year, f"{int(month):02d}", *rest) for site, year, month, *rest in events])
+    bump_data_version()
+
+# --- 💰 비용원장: 금액 입력을 한 건씩 추가만 하는 원장 ---
+def _create_cost_ledger(conn):
+    conn.execute(_LEDGER_TABLE_SQL.format(schema=""))
+    # 현장·기간별 합계 (fetch_summary_data)와 단계별 합계·정정 차액 계산을 인덱스만으로 처리
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_비용원장_현장기간
+        ON 비용원장 (현장명, 연도, 월, 비용항목, 금액)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_비용원장_단계
+        ON 비용원장 (현장명, 연도, 월, 비용유형, 단계번호, 비용항목, 금액)
+    ''')
+
+def _migrate_amounts_to_ledger(conn):
+    """절차상태 금액 컬럼 값을 비용원장 행으로 옮기고 컬럼은 0으로 둔 뒤 월별요약을 다시 계산합니다."""
+    conn.execute('''
+        INSERT INTO 비용원장 (현장명, 연도, 월, 비용유형, 단계번호, 비용항목, 금액, 입력자, 입력시각)
+        SELECT 현장명, 연도, 월, 비용유형, 단계번호, 비용항목, 금액, '이전', ?
+        FROM (
+            SELECT 현장명, 연도, 월, 비용유형, 단계번호, '기성금' AS 비용항목, 기성금 AS 금액 FROM 절차상태
+            UNION ALL
+            SELECT 현장명, 연도, 월, 비용유형, 단계번호, '노무비', 노무비 FROM 절차상태
+            UNION ALL
+            SELECT 현장명, 연도, 월, 비용유형, 단계번호, '투입비', 투입비 FROM 절차상태
+        )
+        WHERE IFNULL(금액, 0) != 0
+    ''', (time.time(),))
+    conn.execute('''
+        UPDATE 절차상태 SET 기성금=0, 노무비=0, 투입비=0
+        WHERE IFNULL(기성금, 0) != 0 OR IFNULL(노무비, 0) != 0 OR IFNULL(투입비, 0) != 0
+    ''')
+    # 원장 추가 트리거가 이미 반영된 금액을 한 번 더 더했으므로 원본에서 다시 계산
+    _rebuild_monthly_summary(conn)
+
+# 단계의 현재 합계와 새 금액의 차액만 한 행으로 추가 (같은 금액이면 추가하지 않음)
+_LEDGER_SET_SQL = '''
+    INSERT INTO 비용원장 (현장명, 연도, 월, 비용유형, 단계번호, 비용항목, 금액, 입력자, 입력시각)
+    SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7 - 합계, ?8, ?9
+    FROM (
+        SELECT IFNULL(SUM(금액), 0) AS 합계 FROM 비용원장
+        WHERE 현장명=?1 AND 연도=?2 AND 월=?3 AND 비용유형=?4 AND 단계번호=?5 AND 비용항목=?6
+    )
+    WHERE ?7 != 합계
+'''
+
+def _record_amounts(conn, entries, 입력자):
+    """(현장명, 연도, 월, 비용유형, 단계번호, 비용항목, 금액) 목록을 단계 금액으로 기록합니다."""
+    for entry in entries:
+        if entry[5] not in AMOUNT_COLUMNS:
+            raise ValueError(f"알 수 없는 비용항목: {entry[5]}")
+    now = time.time()
+    conn.executemany(_LEDGER_SET_SQL, [(*entry, 입력자 or "", now) for entry in entries])
+
+@timed("db.fetch_cost_entries")
+@cached_query()
+def fetch_cost_entries(site, year, month, cost_type):
+    """한 절차의 금액 입력 이력 (단계번호, 비용항목, 금액, 입력자, 입력시각)을 시간순으로."""
     with get_connection() as conn:
-        for step_no, task, dept in step_list:
-            conn.execute('''
-                INSERT OR IGNORE INTO 절차상태
-                (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (site, year, month, cost_type, step_no, task, dept))
+        return conn.execute('''
+            SELECT 단계번호, 비용항목, 금액, 입력자, 입력시각 FROM 비용원장
+            WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=?
+            ORDER BY id
+        ''', (site, year, f"{int(month):02d}", cost_type)).fetchall()
+
+@timed("db.rebuild_monthly_summary")
+@retry_on_busy
+def rebuild_monthly_summary():
+    """월별요약을 절차상태 전체에서 다시 계산합니다. 재계산된 행 수를 반환합니다."""
+    with get_connection() as conn:
+        _create_monthly_summary(conn)
+        _rebuild_monthly_summary(conn)
         conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM 월별요약").fetchone()[0]
+    bump_data_version()
+    return count
+
+def verify_monthly_summary():
+    """월별요약과 원본 집계를 비교해 서로 다른 (키, 요약값, 원본값) 목록을 반환합니다."""
+    with get_connection() as conn:
+        expected = {row[:4]: row[4:] for row in conn.execute(_SUMMARY_SOURCE_SQL.format(schema="", amounts=_LEDGER_ONLY))}
+        actual = {row[:4]: row[4:] for row in conn.execute("SELECT * FROM 월별요약")}
+    return [
+        (key, actual.get(key), expected.get(key))
+        for key in sorted(set(expected) | set(actual))
+        if actual.get(key) != expected.get(key)
+    ]
+
+# --- 🧊 연도별 보관 DB: 마감 연도를 별도 파일로 옮기고 필요할 때만 읽기 전용으로 ATTACH ---
+_SUMMARY_COLUMNS = "현장명, 연도, 월, 비용유형, 행수, 기성금, 노무비, 투입비"
+
+
+def archive_path(year):
+    return os.path.join(ARCHIVE_DIR, f"절차상태_{year}.db")
+
+
+def _sqlite_uri(path, mode=None):
+    uri = "file:" + urllib.parse.quote(os.path.abspath(path))
+    return f"{uri}?mode={mode}" if mode else uri
+
+
+def _key_year(key):
+    # 절차 상태 키는 "현장명_연도_월_비용유형" 형식
+    parts = key.split("_")
+    return parts[1] if len(parts) >= 4 else None
+
+
+@cached_query()
+def archived_years():
+    """보관 DB로 옮긴 연도 목록."""
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT 연도 FROM 보관연도 ORDER BY 연도")]
+
+
+def archive_stats():
+    with get_connection() as conn:
+        return conn.execute("SELECT 연도, 경로, 행수, 보관시각 FROM 보관연도 ORDER BY 연도").fetchall()
+
+
+@contextmanager
+def summary_source(years=None, include_main=True):
+    """월별요약을 읽을 (커넥션, FROM 절 원본)을 돌려줍니다.
+
+    years에 보관된 연도가 있으면 그 연도 DB만 읽기 전용으로 ATTACH한 전용 커넥션을 쓰고,
+    없으면 풀 커넥션과 운영 DB의 월별요약을 그대로 씁니다. years=None이면 모든 보관 연도를 포함합니다.
+    include_main=False면 보관 연도만 읽으며, 읽을 보관 연도가 없으면 원본은 None입니다.
+    """
+    wanted = [y for y in archived_years() if years is None or y in years]
+    if not wanted:
+        with get_connection() as conn:
+            yield conn, "월별요약" if include_main else None
+        return
+
+    conn = sqlite3.connect(_sqlite_uri(DB_PATH), uri=True, timeout=BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False)
+    try:
+        if _statement_tracer is not None:
+            conn.set_trace_callback(_statement_tracer)
+        parts = [f"SELECT {_SUMMARY_COLUMNS} FROM main.월별요약"] if include_main else []
+        for year in wanted:
+            conn.execute(f"ATTACH DATABASE ? AS arc_{year}", (_sqlite_uri(archive_path(year), "ro"),))
+            parts.append(f"SELECT {_SUMMARY_COLUMNS} FROM arc_{year}.월별요약")
+        yield conn, f"({' UNION ALL '.join(parts)})"
+    finally:
+        conn.close()
+
+
+@timed("db.archive_year")
+@retry_on_busy
+def archive_year(year):
+    """마감된 연도의 절차 데이터를 연도별 보관 DB로 옮기고 운영 DB에서 지웁니다. 옮긴 행 수를 반환합니다.
+
+    보관 DB에 먼저 복사해 커밋한 뒤, 복사본과 버전이 같은 행만 운영 DB에서 지우므로
+    도중에 실패하거나 그사이 수정된 행이 있어도 데이터를 잃지 않고 다시 실행할 수 있습니다.
+    """
+    year = str(year)
+    if not year.isdigit() or int(year) >= datetime.now().year:
+        raise ValueError(f"마감되지 않은 연도는 보관할 수 없습니다: {year}")
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(year)
+
+    with get_connection() as conn:
+        conn.execute("ATTACH DATABASE ? AS arc", (path,))
+        try:
+            state_keys = [(k,) for (k,) in conn.execute("SELECT 키 FROM main.절차진행상태")
+                          if _key_year(k) == year]
 
+            # 1단계: 보관 DB에 복사 (다시 실행해도 같은 결과)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for ddl in (_STEP_TABLE_SQL, _STATE_TABLE_SQL, _LEDGER_TABLE_SQL, _STEP_EVENT_TABLE_SQL,
+                            _SUMMARY_TABLE_SQL):
+                    conn.execute(ddl.format(schema="arc."))
+                conn.execute("INSERT OR REPLACE INTO arc.절차상태 SELECT * FROM main.절차상태 WHERE 연도=?", (year,))
+                conn.execute("INSERT OR IGNORE INTO arc.비용원장 SELECT * FROM main.비용원장 WHERE 연도=?", (year,))
+                conn.execute("INSERT OR IGNORE INTO arc.단계이벤트 SELECT * FROM main.단계이벤트 WHERE 연도=?", (year,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO arc.절차진행상태 SELECT * FROM main.절차진행상태 WHERE 키=?", state_keys
+                )
+                conn.execute("DELETE FROM arc.월별요약")
+                conn.execute(f"INSERT INTO arc.월별요약 {_SUMMARY_SOURCE_SQL.format(schema='arc.', amounts=_COLUMN_AMOUNTS)}")
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+            # 2단계: 복사본과 같은 버전의 행만 운영 DB에서 삭제
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                moved = conn.execute('''
+                    DELETE FROM main.절차상태
+                    WHERE 연도=? AND (현장명, 연도, 월, 비용유형, 단계번호, 버전) IN (
+                        SELECT 현장명, 연도, 월, 비용유형, 단계번호, 버전 FROM arc.절차상태 WHERE 연도=?
+                    )
+                ''', (year, year)).rowcount
+                conn.execute("DELETE FROM main.단계진행중 WHERE 연도=?", (year,))
+                # 이벤트 행도 바뀌지 않으므로 복사된 id면 같은 행
+                conn.execute('''
+                    DELETE FROM main.단계이벤트
+                    WHERE 연도=? AND id IN (SELECT id FROM arc.단계이벤트 WHERE 연도=?)
+                ''', (year, year))
+                # 원장 행은 바뀌지 않으므로 복사된 id면 같은 행
+                conn.execute('''
+                    DELETE FROM main.비용원장
+                    WHERE 연도=? AND id IN (SELECT id FROM arc.비용원장 WHERE 연도=?)
+                ''', (year, year))
+                conn.executemany('''
+                    DELETE FROM main.절차진행상태
+                    WHERE 키=? AND 버전 = (SELECT a.버전 FROM arc.절차진행상태 AS a WHERE a.키=?)
+                ''', [(k, k) for (k,) in state_keys])
+                conn.execute('''
+                    INSERT OR REPLACE INTO main.보관연도 (연도, 경로, 행수)
+                    VALUES (?, ?, (SELECT COUNT(*) FROM arc.절차상태))
+                ''', (year, path))
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE arc")
+
+    bump_data_version()
+    return moved
+
+
+def _initial_status(current_step, step_no):
+    """새로 만드는 단계 행의 상태. 현재 단계 앞은 완료, 뒤는 작업함에 나타나지 않는 '대기'."""
+    if step_no == current_step:
+        return "진행중"
+    return "완료" if step_no < current_step else "대기"
+
+
+@timed("db.bulk_upsert_amounts")
+@retry_on_busy
+def bulk_upsert_amounts(chunks, new_state):
+    """금액 행 묶음들을 하나의 트랜잭션으로 기록합니다. 기록한 행 수를 반환합니다.
+
+    chunks: (행 목록, 입력자)의 이터러블. 행은 (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서, 금액컬럼, 금액)
+    new_state: 절차 상태 레코드가 아직 없을 때 비용유형으로 기본 상태를 만드는 함수
+    """
+    total = 0
+    with write_transaction() as conn:
+        for rows, 입력자 in chunks:
+            if not rows:
+                continue
+            # 절차 진행 상태의 저장 금액도 같은 트랜잭션에서 갱신
+            amounts = {}
+            for site, year, month, cost_type, _, _, _, col, 금액 in rows:
+                key = f"{site}_{year}_{month}_{cost_type}"
+                amounts.setdefault(key, (cost_type, {}))[1][col] = 금액
+            placeholders = ",".join("?" * len(amounts))
+            existing = dict(conn.execute(
+                f"SELECT 키, 상태 FROM 절차진행상태 WHERE 키 IN ({placeholders})", list(amounts)
+            ).fetchall())
+            states, updates = {}, []
+            for key, (cost_type, values) in amounts.items():
+                state = states[key] = json.loads(existing[key]) if key in existing else new_state(cost_type)
+                state["amounts"].update(values)
+                updates.append((key, _state_json(state)))
+
+            # 현재 단계보다 앞서 금액이 들어온 단계 행은 '대기'로 만들어 작업함에 미리 나타나지 않게 함
+            conn.executemany('''
+                INSERT OR IGNORE INTO 절차상태
+                (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서, 상태)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(*row[:7], _initial_status(states["{}_{}_{}_{}".format(*row[:4])]["current_step"], row[4]))
+                  for row in rows])
+            _record_amounts(conn, [(*row[:5], row[7], row[8]) for row in rows], 입력자)
+            conn.executemany(f"UPDATE 절차상태 SET 버전=버전+1 WHERE {_STEP_WHERE}", [row[:5] for row in rows])
+            conn.executemany('''
+                INSERT INTO 절차진행상태 (키, 상태, 수정시각)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(키) DO UPDATE SET
+                    상태=excluded.상태, 수정시각=excluded.수정시각, 버전=버전+1
+            ''', updates)
+            total += len(rows)
+    bump_data_version()
+    return total
+
+@timed("db.load_procedure_steps")
+@cached_query()
 def load_procedure_steps(site, year, month, cost_type):
     month = f"{int(month):02d}"
+    # 절차상태 컬럼 순서 그대로, 금액만 단계별 비용원장 합계로 채움
     with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT * FROM 절차상태
-            WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=?
-            ORDER BY 단계번호
+            SELECT s.현장명, s.연도, s.월, s.비용유형, s.단계번호, s.작업내용, s.담당부서, s.상태,
+                   IFNULL(l.기성금, 0), IFNULL(l.노무비, 0), IFNULL(l.투입비, 0), s.버전
+            FROM 절차상태 AS s
+            LEFT JOIN (
+                SELECT 단계번호,
+                       SUM(CASE 비용항목 WHEN '기성금' THEN 금액 END) AS 기성금,
+                       SUM(CASE 비용항목 WHEN '노무비' THEN 금액 END) AS 노무비,
+                       SUM(CASE 비용항목 WHEN '투입비' THEN 금액 END) AS 투입비
+                FROM 비용원장
+                WHERE 현장명=?1 AND 연도=?2 AND 월=?3 AND 비용유형=?4
+                GROUP BY 단계번호
+            ) AS l ON l.단계번호 = s.단계번호
+            WHERE s.현장명=?1 AND s.연도=?2 AND s.월=?3 AND s.비용유형=?4
+            ORDER BY s.단계번호
         ''', (site, year, month, cost_type))
         return cursor.fetchall()
 
-def update_step_status(site, year, month, cost_type, step_no, 상태, 금액컬럼=None, 금액=None):
-    month = f"{int(month):02d}"
-    with get_connection() as conn:
-        print("🛠️ [DEBUG] update_step_status() 호출됨")
-        print("    - site:", site)
-        print("    - year:", year)
-        print("    - month:", month)
-        print("    - cost_type:", cost_type)
-        print("    - step_no:", step_no)
-        print("    - 상태:", 상태)
-        print("    - 금액컬럼:", 금액컬럼)
-        print("    - 금액:", 금액)
-
-        conn.execute('''
-            INSERT OR IGNORE INTO 절차상태
-            (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
-            VALUES (?, ?, ?, ?, ?, '', '')
-        ''', (site, year, month, cost_type, step_no))
-
-        if 금액컬럼:
-            result = conn.execute(f'''
-                UPDATE 절차상태
-                SET 상태=?, {금액컬럼}=?
-                WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=? AND 단계번호=?
-            ''', (상태, 금액, site, year, month, cost_type, step_no))
-            print(f"🧪 [DEBUG] DB UPDATE rowcount: {result.rowcount}")
-        else:
-            conn.execute('''
-                UPDATE 절차상태
-                SET 상태=?
-                WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=? AND 단계번호=?
-            ''', (상태, site, year, month, cost_type, step_no))
+_STEP_WHERE = "현장명=? AND 연도=? AND 월=? AND 비용유형=? AND 단계번호=?"
 
-        conn.commit()
+def _write_step_status(conn, cells):
+    """{셀: 상태}를 기록합니다. 없는 행은 절차 정의의 작업내용·담당부서로 만듭니다."""
+    _log_step_events(conn, _status_events(conn, cells))
+    conn.executemany('''
+        INSERT OR IGNORE INTO 절차상태
+        (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(*cell, *_step_meta(cell[3], cell[4])) for cell in cells])
+    conn.executemany(f'''
+        UPDATE 절차상태
+        SET 상태=?, 버전=버전+1
+        WHERE {_STEP_WHERE}
+    ''', [(상태, *cell) for cell, 상태 in cells.items()])
 
-def activate_next_step(site, year, month, cost_type, current_step_no):
-    month = f"{int(month):02d}"
-    with get_connection() as conn:
-        conn.execute('''
-            UPDATE 절차상태
-            SET 상태='완료'
-            WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=? AND 단계번호=?
-        ''', (site, year, month, cost_type, current_step_no))
+def _advance_step(conn, site, year, month, cost_type, current_step_no):
+    """현재 단계를 완료로, 다음 단계를 진행중으로 바꿉니다."""
+    current = (site, year, month, cost_type, current_step_no)
+    following = (site, year, month, cost_type, current_step_no + 1)
+    _log_step_events(conn, _status_events(conn, {current: "완료"}))
+    conn.execute(f'''
+        UPDATE 절차상태
+        SET 상태='완료', 버전=버전+1
+        WHERE {_STEP_WHERE}
+    ''', current)
 
+    if WORKFLOW.next_step(cost_type, current_step_no) is not None:
+        _log_step_events(conn, [(*following, "시작")])
+        # 다음 단계 행이 없으면 만들어 두어야 담당 부서 작업함에 바로 나타남
         conn.execute('''
+            INSERT OR IGNORE INTO 절차상태
+            (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (*following, *_step_meta(cost_type, current_step_no + 1)))
+        conn.execute(f'''
             UPDATE 절차상태
-            SET 상태='진행중'
-            WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=? AND 단계번호=?
+            SET 상태='진행중', 버전=버전+1
+            WHERE {_STEP_WHERE}
               AND 상태 != '완료'
-        ''', (site, year, month, cost_type, current_step_no + 1))
+        ''', following)
 
-        conn.commit()
+@timed("db.fetch_summary_data")
+@cached_query()
+def fetch_summary_data(include_archived=False):
+    """금액이 입력된 현장·월별 (현장명, 연도, 월, 기성금, 노무비, 투입비) 합계.
 
-def fetch_summary_data():
-    with get_connection() as conn:
+    운영 DB는 비용원장을 idx_비용원장_현장기간 인덱스만으로 집계하고,
+    보관 연도는 보관할 때 확정된 월별요약을 읽습니다.
+    """
+    with summary_source(None if include_archived else (), include_main=False) as (conn, archived):
+        archived_sql = f'''
+            UNION ALL
+            SELECT 현장명, 연도, 월, 기성금, 노무비, 투입비 FROM {archived}
+        ''' if archived else ""
         cursor = conn.cursor()
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT 현장명, 연도, 월,
                    SUM(기성금) AS 기성금,
                    SUM(노무비) AS 노무비,
                    SUM(투입비) AS 투입비
-            FROM 절차상태
+            FROM (
+                SELECT 현장명, 연도, 월,
+                       SUM(CASE 비용항목 WHEN '기성금' THEN 금액 ELSE 0 END) AS 기성금,
+                       SUM(CASE 비용항목 WHEN '노무비' THEN 금액 ELSE 0 END) AS 노무비,
+                       SUM(CASE 비용항목 WHEN '투입비' THEN 금액 ELSE 0 END) AS 투입비
+                FROM main.비용원장
+                GROUP BY 현장명, 연도, 월
+                {archived_sql}
+            )
             GROUP BY 현장명, 연도, 월
             ORDER BY 현장명, 연도, 월
         ''')
         return cursor.fetchall()
+
+
+
+@timed("db.fetch_summary_page")
+@cached_query()
+def fetch_summary_page(site=None, year=None, after=None, limit=50, include_archived=False):
+    """월별 합계를 (현장명, 연도, 월) 순서로 한 페이지씩 읽습니다 (키셋 페이지네이션).
+
+    after는 이전 페이지 마지막 행의 (현장명, 연도, 월)입니다. 월별요약 기본키 순서로 읽으므로
+    OFFSET처럼 앞 페이지를 건너뛰며 세지 않고, 뒤쪽 페이지도 같은 속도로 찾습니다.
+    """
+    where, params = [], []
+    if site is not None:
+        where.append("현장명 = ?")
+        params.append(site)
+    if year is not None:
+        where.append("연도 = ?")
+        params.append(year)
+    if after is not None:
+        where.append("(현장명, 연도, 월) > (?, ?, ?)")
+        params.extend(after)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    with summary_source(None if include_archived else ()) as (conn, source):
+        return conn.execute(f'''
+            SELECT 현장명, 연도, 월, SUM(기성금), SUM(노무비), SUM(투입비)
+            FROM {source}
+            {where_sql}
+            GROUP BY 현장명, 연도, 월
+            ORDER BY 현장명, 연도, 월
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+
+def iter_summary_rows(site=None, start=None, end=None, chunk_size=1000):
+    """월별 합계를 (현장명, 연도, 월, 기성금, 노무비, 투입비) 행으로 조금씩 읽어 돌려줍니다.
+
+    start/end는 ("2024", "01") 같은 (연도, 월) 튜플이며 양끝을 포함합니다.
+    기간에 보관된 연도가 걸치면 그 연도의 보관 DB도 함께 읽습니다.
+    전체 결과를 메모리에 올리지 않도록 fetchmany로 chunk_size씩 가져옵니다.
+    """
+    years = [y for y in archived_years()
+             if (start is None or y >= start[0]) and (end is None or y <= end[0])]
+    where, params = [], []
+    if site is not None:
+        where.append("현장명 = ?")
+        params.append(site)
+    if start is not None:
+        where.append("(연도, 월) >= (?, ?)")
+        params.extend(start)
+    if end is not None:
+        where.append("(연도, 월) <= (?, ?)")
+        params.extend(end)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    with summary_source(years) as (conn, source):
+        cursor = conn.execute(f'''
+            SELECT 현장명, 연도, 월, SUM(기성금), SUM(노무비), SUM(투입비)
+            FROM {source}
+            {where_sql}
+            GROUP BY 현장명, 연도, 월
+            ORDER BY 현장명, 연도, 월
+        ''', params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+
+
+# --- 📥 부서별 작업함 ---
+@timed("db.fetch_department_inbox")
+@cached_query()
+def fetch_department_inbox(dept=None, limit=20, offset=0):
+    """담당부서의 진행중 단계를 모든 현장·기간에 걸쳐 한 번에 조회합니다.
+
+    (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서, 전체건수) 행을 최신 기간부터 돌려줍니다.
+    dept가 None이면 모든 부서의 진행중 단계를 조회합니다.
+    """
+    where, params = "상태 = '진행중'", []
+    if dept is not None:
+        where = "담당부서 = ? AND " + where
+        params.append(dept)
+    with get_connection() as conn:
+        return conn.execute(f'''
+            SELECT 현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서,
+                   COUNT(*) OVER () AS 전체건수
+            FROM 절차상태
+            WHERE {where}
+            ORDER BY 연도 DESC, 월 DESC, 현장명, 비용유형, 단계번호
+            LIMIT ? OFFSET ?
+        ''', (*params, limit, offset)).fetchall()
+
+
+@timed("db.fetch_pending_procedures")
+@cached_query()
+def fetch_pending_procedures(dept, cost_type, step_no):
+    """해당 단계가 진행중인 절차의 (현장명, 연도, 월) 목록을 최신 기간부터 돌려줍니다."""
+    with get_connection() as conn:
+        return conn.execute('''
+            SELECT 현장명, 연도, 월
+            FROM 절차상태
+            WHERE 담당부서 = ? AND 상태 = '진행중' AND 비용유형 = ? AND 단계번호 = ?
+            ORDER BY 연도 DESC, 월 DESC, 현장명
+        ''', (dept, cost_type, step_no)).fetchall()
+
+
+@timed("db.fetch_step_lead_times")
+@cached_query()
+def fetch_step_lead_times():
+    """단계별 (비용유형, 단계번호, 담당부서, 완료수, 평균초, 최대초, 진행중 건수, 가장 오래 기다린 시작시각).
+
+    단계소요통계·단계진행중은 이벤트가 기록될 때 트리거로 갱신되므로 이벤트 이력을 훑지 않습니다.
+    """
+    with get_connection() as conn:
+        return conn.execute('''
+            WITH 진행 AS (
+                SELECT 비용유형, 단계번호, MAX(담당부서) AS 담당부서, COUNT(*) AS 건수, MIN(시작시각) AS 최초
+                FROM 단계진행중 GROUP BY 비용유형, 단계번호
+            ),
+            단계 AS (
+                SELECT 비용유형, 단계번호 FROM 단계소요통계
+                UNION
+                SELECT 비용유형, 단계번호 FROM 진행
+            )
+            SELECT d.비용유형, d.단계번호, COALESCE(s.담당부서, p.담당부서),
+                   IFNULL(s.완료수, 0), s.합계초 / s.완료수, s.최대초,
+                   IFNULL(p.건수, 0), p.최초
+            FROM 단계 AS d
+            LEFT JOIN 단계소요통계 AS s ON s.비용유형=d.비용유형 AND s.단계번호=d.단계번호
+            LEFT JOIN 진행 AS p ON p.비용유형=d.비용유형 AND p.단계번호=d.단계번호
+            ORDER BY d.비용유형, d.단계번호
+        ''').fetchall()
+
+
+@timed("db.fetch_step_events")
+@cached_query()
+def fetch_step_events(site, year, month, cost_type):
+    """한 절차의 단계 전이 이력 (단계번호, 담당부서, 이벤트, 시각)을 시간순으로."""
+    with get_connection() as conn:
+        return conn.execute('''
+            SELECT 단계번호, 담당부서, 이벤트, 시각 FROM 단계이벤트
+            WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=?
+            ORDER BY 시각, id
+        ''', (site, year, f"{int(month):02d}", cost_type)).fetchall()
+
+
+@timed("db.complete_steps_batch")
+@retry_on_busy
+def complete_steps_batch(cost_type, step_no, procedures, new_state):
+    """같은 단계에 있는 여러 절차를 한 트랜잭션으로 완료하고 다음 단계로 넘깁니다.
+
+    procedures: (현장명, 연도, 월) 목록
+    new_state: 절차 상태 레코드가 아직 없을 때 비용유형으로 기본 상태를 만드는 함수
+    (완료한 절차 목록, [(현장명, 연도, 월, 사유), ...])를 반환합니다.
+    """
+    task = WORKFLOW.step(cost_type, step_no).task
+    label = WORKFLOW.cost_columns.get((cost_type, step_no))
+    next_no = WORKFLOW.next_step(cost_type, step_no)
+    procedures = [(site, year, f"{int(month):02d}") for site, year, month in procedures]
+    if not procedures:
+        return [], []
+
+    completed, skipped, updates = [], [], []
+    with write_transaction() as conn:
+        keys = [f"{site}_{year}_{month}_{cost_type}" for site, year, month in procedures]
+        placeholders = ",".join("?" * len(keys))
+        existing = dict(conn.execute(
+            f"SELECT 키, 상태 FROM 절차진행상태 WHERE 키 IN ({placeholders})", keys
+        ).fetchall())
+
+        for key, proc in zip(keys, procedures):
+            state = json.loads(existing[key]) if key in existing else new_state(cost_type)
+            if state["current_step"] != step_no:
+                skipped.append((*proc, f"현재 {state['current_step']}단계"))
+                continue
+            if label and label not in state["amounts"]:
+                skipped.append((*proc, f"{label} 미입력"))
+                continue
+            state["status"][task] = "완료"
+            if next_no is not None:
+                state["current_step"] = next_no
+            updates.append((key, _state_json(state)))
+            completed.append(proc)
+
+        if completed:
+            _log_step_events(conn, _status_events(conn, {(*proc, cost_type, step_no): "완료" for proc in completed}))
+            if next_no is not None:
+                _log_step_events(conn, [(*proc, cost_type, next_no, "시작") for proc in completed])
+            conn.executemany('''
+                INSERT INTO 절차진행상태 (키, 상태, 수정시각)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(키) DO UPDATE SET
+                    상태=excluded.상태, 수정시각=excluded.수정시각, 버전=버전+1
+            ''', updates)
+            current = [(*proc, cost_type, step_no) for proc in completed]
+            conn.executemany('''
+                INSERT OR IGNORE INTO 절차상태
+                (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(*cell, *_step_meta(cost_type, step_no)) for cell in current])
+            conn.executemany(f'''
+                UPDATE 절차상태 SET 상태='완료', 버전=버전+1
+                WHERE {_STEP_WHERE}
+            ''', current)
+            if next_no is not None:
+                following = [(*proc, cost_type, next_no) for proc in completed]
+                conn.executemany('''
+                    INSERT OR IGNORE INTO 절차상태
+                    (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', [(*cell, *_step_meta(cost_type, next_no)) for cell in following])
+                conn.executemany(f'''
+                    UPDATE 절차상태 SET 상태='진행중', 버전=버전+1
+                    WHERE {_STEP_WHERE} AND 상태 != '완료'
+                ''', following)
+
+    if completed:
+        bump_data_version()
+    return completed, skipped
+
+# --- 🗂️ 절차별 진행 상태 저장소 (키 단위 레코드) ---
+# 상태 dict의 "version" 값은 DB의 버전 컬럼에서 채워지며 JSON 본문에는 저장하지 않음
+@timed("db.load_procedure_state")
+def load_procedure_state(key):
+    with get_connection() as conn:
+        row = conn.execute("SELECT 상태, 버전 FROM 절차진행상태 WHERE 키=?", (key,)).fetchone()
+    if not row:
+        return None
+    state = json.loads(row[0])
+    state["version"] = row[1]
+    return state
+
+def procedure_state_version(key):
+    with get_connection() as conn:
+        row = conn.execute("SELECT 버전 FROM 절차진행상태 WHERE 키=?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _state_json(state):
+    return json.dumps({k: v for k, v in state.items() if k != "version"}, ensure_ascii=False)
+
+# 상태 저장 지표: 바뀐 것이 없어 쓰기 트랜잭션 없이 건너뛴 저장 vs 실제로 커밋한 저장
+_save_stats_lock = threading.Lock()
+_save_stats = {"committed": 0, "skipped": 0}
+
+def _count_save(kind):
+    with _save_stats_lock:
+        _save_stats[kind] += 1
+
+def save_stats():
+    """절차 상태 저장 지표 (커밋 수, 변경이 없어 건너뛴 수, 건너뛴 비율)."""
+    with _save_stats_lock:
+        stats = dict(_save_stats)
+    total = stats["committed"] + stats["skipped"]
+    stats["skip_rate"] = (stats["skipped"] / total) if total else 0.0
+    return stats
+
+def _state_unchanged(key, state):
+    """저장된 상태가 같은 버전·같은 내용이면 True (읽기만 하므로 쓰기 잠금을 잡지 않음)."""
+    with get_connection() as conn:
+        row = conn.execute("SELECT 상태, 버전 FROM 절차진행상태 WHERE 키=?", (key,)).fetchone()
+    return row is not None and row[1] == state["version"] and row[0] == _state_json(state)
+
+@timed("db.save_procedure_state")
+@retry_on_busy
+def save_procedure_state(key, state, cells=None, amounts=(), 입력자="", complete=None, reset=False):
+    """state["version"]이 DB 버전과 같을 때만 저장합니다 (버전이 없으면 새 레코드로 추가).
+
+    다른 세션이 먼저 저장했다면 VersionConflict를 내며, 성공하면 state["version"]을 올리고 True를 반환합니다.
+    함께 기록할 것이 없고 저장된 내용과 같으면 쓰지 않고 False를 반환합니다.
+    함께 주는 단계 상태(cells: {셀: 상태}), 금액(amounts: (셀..., 비용항목, 금액) 목록),
+    단계 완료(complete: 완료할 셀), 초기화(reset: 1단계만 진행중, 나머지는 대기)는
+    같은 트랜잭션에서 기록되므로 충돌하면 아무것도 기록되지 않습니다.
+    """
+    expected = state.get("version")
+    cells = cells or {}
+    if expected is not None and not (cells or amounts or complete or reset) and _state_unchanged(key, state):
+        _count_save("skipped")
+        return False
+    # 키는 "현장명_연도_월_비용유형" 형식
+    proc = tuple(key.split("_", 3))
+    with write_transaction() as conn:
+        if expected is None:
+            cur = conn.execute('''
+                INSERT OR IGNORE INTO 절차진행상태 (키, 상태, 수정시각, 버전)
+                VALUES (?, ?, CURRENT_TIMESTAMP, 0)
+            ''', (key, _state_json(state)))
+        else:
+            cur = conn.execute('''
+                UPDATE 절차진행상태
+                SET 상태=?, 수정시각=CURRENT_TIMESTAMP, 버전=버전+1
+                WHERE 키=? AND 버전=?
+            ''', (_state_json(state), key, expected))
+        if cur.rowcount != 1:
+            raise VersionConflict(key)
+        if cells:
+            _write_step_status(conn, cells)
+        if amounts:
+            _record_amounts(conn, amounts, 입력자)
+        if complete:
+            _advance_step(conn, *complete)
+        if reset:
+            _reset_steps(conn, proc)
+    state["version"] = 0 if expected is None else expected + 1
+    _count_save("committed")
+    if cells or amounts or complete or reset:
+        bump_data_version()
+    return True
+
+
+def _reset_steps(conn, proc):
+    """절차 (현장명, 연도, 월, 비용유형)의 단계 행을 1단계 진행중, 나머지 대기로 되돌립니다."""
+    _log_step_events(conn, [(*proc, 0, "초기화"), (*proc, 1, "시작")])
+    conn.execute('''
+        INSERT OR IGNORE INTO 절차상태
+        (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+    ''', (*proc, *_step_meta(proc[3], 1)))
+    conn.execute('''
+        UPDATE 절차상태
+        SET 상태 = CASE 단계번호 WHEN 1 THEN '진행중' ELSE '대기' END, 버전=버전+1
+        WHERE 현장명=? AND 연도=? AND 월=? AND 비용유형=?
+    ''', proc)
+
+def list_procedure_state_keys(prefix=""):
+    """prefix로 시작하는 절차 키 목록. 기본키 범위 검색이라 전체 키를 읽지 않습니다."""
+    with get_connection() as conn:
+        if not prefix:
+            return [row[0] for row in conn.execute("SELECT 키 FROM 절차진행상태 ORDER BY 키")]
+        # 마지막 글자만 하나 올린 문자열이 prefix로 시작하는 키들의 상한 (BINARY 정렬)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return [row[0] for row in conn.execute(
+            "SELECT 키 FROM 절차진행상태 WHERE 키 >= ? AND 키 < ? ORDER BY 키", (prefix, upper)
+        )]
+
+@retry_on_busy
+def migrate_state_file(path):
+    """기존 JSON 스냅샷 파일을 절차진행상태 테이블로 한 번만 옮깁니다. 옮긴 키 수를 반환합니다."""
+    with get_connection() as conn:
+        done = conn.execute("SELECT 값 FROM 메타정보 WHERE 키='state_file_migrated'").fetchone()
+        if done or not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        conn.executemany('''
+            INSERT OR IGNORE INTO 절차진행상태 (키, 상태) VALUES (?, ?)
+        ''', [(k, json.dumps(v, ensure_ascii=False)) for k, v in data.items()])
+        conn.execute("INSERT OR REPLACE INTO 메타정보 (키, 값) VALUES ('state_file_migrated', ?)", (path,))
+        conn.commit()
+    return len(data)
+
+
+@timed("db.delete_procedures")
+@retry_on_busy
+def delete_procedures(site, year, months=None):
+    """현장의 특정 연도(months를 주면 그 달들만) 절차 데이터와 진행 상태를 삭제합니다. 삭제한 행 수를 반환합니다."""
+    year = str(year)
+    months = [f"{int(m):02d}" for m in months or ()]
+    where, params = "현장명=? AND 연도=?", [site, year]
+    if months:
+        where += f" AND 월 IN ({','.join('?' * len(months))})"
+        params.extend(months)
+    prefixes = [f"{site}_{year}_{m}_" for m in months] or [f"{site}_{year}_"]
+
+    with write_transaction() as conn:
+        deleted = conn.execute(f"DELETE FROM 절차상태 WHERE {where}", params).rowcount
+        conn.execute(f"DELETE FROM 단계진행중 WHERE {where}", params)
+        conn.execute(f"DELETE FROM 단계이벤트 WHERE {where}", params)
+        conn.execute(f"DELETE FROM 비용원장 WHERE {where}", params)
+        conn.executemany(
+            "DELETE FROM 절차진행상태 WHERE substr(키, 1, length(?)) = ?",
+            [(p, p) for p in prefixes],
+        )
+    bump_data_version()
+    return deleted
@@ -0,0 +1,124 @@
+import time
+
+import streamlit as st
+
+from db import complete_steps_batch, fetch_department_inbox, fetch_pending_procedures
+from notify import batch_events, record_events
+from procedure import new_procedure_state
+from workflow import WORKFLOW
+
+PAGE_SIZE = 20
+
+# main.py 사이드바 입력 위젯의 세션 키 (작업함에서 바로 이동할 때 사용)
+PARAM_KEYS = {
+    "site": "param_site",
+    "year": "param_year",
+    "month": "param_month",
+    "cost_type": "param_cost_type",
+}
+
+
+def open_step(site, year, month, cost_type):
+    """사이드바 선택값을 바꿔 해당 절차 화면으로 이동합니다. (버튼 on_click 콜백)"""
+    st.session_state[PARAM_KEYS["site"]] = site
+    st.session_state[PARAM_KEYS["year"]] = year
+    st.session_state[PARAM_KEYS["month"]] = month
+    st.session_state[PARAM_KEYS["cost_type"]] = cost_type
+    st.session_state.inbox_jump = True
+
+
+def _set_page(page):
+    st.session_state.inbox_page = page
+
+
+@st.fragment
+def inbox_view(sites):
+    if st.session_state.pop("inbox_jump", False):
+        # 사이드바 선택과 절차 화면이 바뀌어야 하므로 작업함만이 아니라 전체를 다시 실행
+        st.rerun()
+    role = st.session_state.get("role", "")
+    if role == "관리자":
+        dept = st.selectbox("담당부서", ["전체", *WORKFLOW.dept_steps], key="inbox_dept")
+        dept = None if dept == "전체" else dept
+    else:
+        dept = role
+
+    page = st.session_state.get("inbox_page", 0)
+    rows = fetch_department_inbox(dept, PAGE_SIZE, page * PAGE_SIZE)
+    if not rows and page:
+        # 처리가 끝나 건수가 줄어든 경우 첫 페이지로
+        page = 0
+        _set_page(0)
+        rows = fetch_department_inbox(dept, PAGE_SIZE, 0)
+    if not rows:
+        st.info("진행중인 담당 단계가 없습니다.")
+        return
+
+    total = rows[0][7]
+    pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    st.caption(f"진행중 {total:,}건 · {page + 1}/{pages} 페이지")
+
+    for i, (site, year, month, cost_type, step_no, task, step_dept, _) in enumerate(rows):
+        col1, col2 = st.columns([5, 1])
+        col1.markdown(f"**{site}** {year}-{month} · {cost_type} · {step_no}. {task} `{step_dept}`")
+        col2.button(
+            "열기", key=f"inbox_open_{i}",
+            disabled=site not in sites,
+            on_click=open_step, args=(site, year, month, cost_type),
+        )
+
+    prev_col, next_col = st.columns(2)
+    prev_col.button("◀ 이전", key="inbox_prev", disabled=page == 0,
+                    on_click=_set_page, args=(page - 1,))
+    next_col.button("다음 ▶", key="inbox_next", disabled=page + 1 >= pages,
+                    on_click=_set_page, args=(page + 1,))
+
+
+def _notify_batch(cost_type, step_no, completed):
+    if not st.session_state.get("email_enabled", True):
+        return
+    try:
+        if record_events(batch_events(cost_type, step_no, completed)):
+            st.toast("📨 담당 부서 요약 메일에 추가되었습니다.")
+    except Exception as e:
+        st.error(f"📛 알림 기록 실패: {e}")
+
+
+@st.fragment
+def batch_complete_view():
+    role = st.session_state.get("role", "")
+    steps = [s for d, dept_steps in WORKFLOW.dept_steps.items()
+             if role in (d, "관리자") for s in dept_steps]
+    if not steps:
+        st.info("일괄 처리할 수 있는 담당 단계가 없습니다.")
+        return
+
+    step = st.selectbox(
+        "단계", steps, key="batch_step",
+        format_func=lambda s: f"{s.cost_type} · {s.no}. {s.task} ({s.dept})",
+    )
+    pending = fetch_pending_procedures(step.dept, step.cost_type, step.no)
+    if not pending:
+        st.info("이 단계에서 진행중인 절차가 없습니다.")
+        return
+
+    labels = {f"{site} / {year}-{month}": (site, year, month) for site, year, month in pending}
+    select_all = st.checkbox(f"진행중 {len(pending)}건 모두 선택", key="batch_all")
+    chosen = list(labels) if select_all else st.multiselect("완료할 절차", list(labels), key="batch_selected")
+
+    if not st.button(f"✅ 선택한 {len(chosen)}건 일괄 완료", disabled=not chosen, key="batch_run"):
+        return
+
+    start = time.perf_counter()
+    completed, skipped = complete_steps_batch(
+        step.cost_type, step.no, [labels[c] for c in chosen], new_procedure_state
+    )
+    _notify_batch(step.cost_type, step.no, completed)
+    elapsed = time.perf_counter() - start
+
+    if completed:
+        st.success(f"✅ {len(completed)}건을 {elapsed:.2f}초 만에 완료했습니다.")
+    if skipped:
+        st.warning(f"⚠️ {len(skipped)}건은 건너뛰었습니다.")
+        st.dataframe([{"현장명": s, "연도": y, "월": m, "사유": r} for s, y, m, r in skipped],
+                     use_container_width=True, hide_index=True)
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import smtplib
+import threading
+import time
+from email.mime.text import MIMEText
+
+from db import get_connection, retry_on_busy, write_transaction
+from profiling import span, timed
+
+# --- 📮 SMTP 설정 (환경변수로 로컬 테스트 서버 지정 가능) ---
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "465"))
+SMTP_USE_SSL = os.environ.get("SMTP_USE_SSL", "1") == "1"
+# 계정·앱 비밀번호는 코드에 두지 않음. 둘 다 설정된 경우에만 로그인 (인증 없는 사내 릴레이는 비워 둠)
+SMTP_USER = os.environ.get("SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+FROM_EMAIL = os.environ.get("SMTP_FROM", SMTP_USER)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 5
+POLL_INTERVAL = 5.0          # 대기열 확인 주기(초)
+IDLE_CLOSE_SECONDS = 60.0    # 이 시간 동안 보낼 메일이 없으면 SMTP 연결 종료
+DEDUP_WINDOW = "-1 day"      # 같은 중복키의 메일은 이 기간 동안 한 번만 대기열에 추가
+BATCH_SIZE = 20
+# '발송중'으로 가져간 메일의 점유 시간(초). 이 시간이 지나도 결과가 기록되지 않으면
+# 발송하던 프로세스가 종료된 것으로 보고 다른 작업자가 다시 가져감
+SEND_LEASE_SECONDS = 600
+
+_schema_ready = False
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def _create_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS 메일발송함 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            수신자 TEXT NOT NULL,
+            제목 TEXT NOT NULL,
+            본문 TEXT NOT NULL,
+            중복키 TEXT NOT NULL,
+            상태 TEXT DEFAULT '대기',
+            시도횟수 INTEGER DEFAULT 0,
+            다음시도 REAL DEFAULT 0,
+            오류 TEXT,
+            생성시각 TEXT DEFAULT CURRENT_TIMESTAMP,
+            발송시각 TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_메일발송함_상태 ON 메일발송함 (상태, 다음시도)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_메일발송함_중복키 ON 메일발송함 (중복키, 생성시각)")
+
+
+def _ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with get_connection() as conn:
+        _create_schema(conn)
+        conn.commit()
+    _schema_ready = True
+
+
+def add_to_outbox(conn, to_email, subject, body, dedup_key=None):
+    """호출한 쪽 트랜잭션 안에서 발송함에 메일을 추가합니다. 커밋 후 wake_worker()를 부르세요.
+
+    새로 추가되면 True, 같은 중복키가 DEDUP_WINDOW 안에 이미 있으면 False.
+    """
+    if not _schema_ready:
+        # 다른 커넥션으로 스키마를 만들면 호출한 쪽 트랜잭션의 쓰기 잠금과 교착되므로 같은 커넥션 사용
+        _create_schema(conn)
+    if dedup_key is None:
+        dedup_key = hashlib.sha1(f"{to_email}\n{subject}\n{body}".encode("utf-8")).hexdigest()
+    cur = conn.execute(f'''
+        INSERT INTO 메일발송함 (수신자, 제목, 본문, 중복키)
+        SELECT ?, ?, ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM 메일발송함
+            WHERE 중복키=? AND 생성시각 > datetime('now', '{DEDUP_WINDOW}')
+        )
+    ''', (to_email, subject, body, dedup_key, dedup_key))
+    return cur.rowcount == 1
+
+
+def wake_worker():
+    start_mail_worker()
+    _wakeup.set()
+
+
+@timed("mail.enqueue")
+@retry_on_busy
+def enqueue_email(to_email, subject, body, dedup_key=None):
+    """메일을 발송함에 넣고 즉시 반환합니다. 새로 추가되면 True, 중복이면 False."""
+    _ensure_schema()
+    with get_connection() as conn:
+        added = add_to_outbox(conn, to_email, subject, body, dedup_key)
+        conn.commit()
+    if added:
+        wake_worker()
+    return added
+
+
+def outbox_stats():
+    _ensure_schema()
+    with get_connection() as conn:
+        rows = conn.execute("SELECT 상태, COUNT(*) FROM 메일발송함 GROUP BY 상태").fetchall()
+    return dict(rows)
+
+
+class MailWorker(threading.Thread):
+    """발송함을 비우는 백그라운드 스레드. 인증된 SMTP 연결 하나를 재사용합니다."""
+
+    def __init__(self):
+        super().__init__(name="mail-outbox", daemon=True)
+        self._smtp = None
+        self._last_used = 0.0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        _wakeup.set()
+
+    def _connect(self):
+        if SMTP_USE_SSL:
+            smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30)
+        else:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_USER and SMTP_PASSWORD:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send(self, to_email, subject, body):
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = FROM_EMAIL
+        msg["To"] = to_email
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, OSError):
+            # 서버가 유휴 연결을 끊은 경우 한 번 다시 연결해서 보냄
+            self._disconnect()
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    @retry_on_busy
+    def _claim_due(self):
+        """보낼 차례인 메일과 점유 시간이 지난 '발송중' 메일을 가져갑니다.
+
+        가져간 메일의 다음시도를 점유 만료 시각으로 바꾸므로, 여러 프로세스의 작업자가 함께 돌아도
+        한 메일은 한 작업자만 보냅니다.
+        """
+        now = time.time()
+        due_sql = '''
+            SELECT id, 수신자, 제목, 본문, 시도횟수 FROM 메일발송함
+            WHERE 상태 IN ('대기', '발송중') AND 다음시도 <= ?
+            ORDER BY id LIMIT ?
+        '''
+        # 보낼 메일이 없는 대부분의 확인은 쓰기 잠금 없이 끝냄
+        with get_connection() as conn:
+            if not conn.execute(due_sql, (now, 1)).fetchone():
+                return []
+        with write_transaction() as conn:
+            rows = conn.execute(due_sql, (now, BATCH_SIZE)).fetchall()
+            conn.executemany(
+                "UPDATE 메일발송함 SET 상태='발송중', 다음시도=? WHERE id=?",
+                [(now + SEND_LEASE_SECONDS, row[0]) for row in rows],
+            )
+        return rows
+
+    @retry_on_busy
+    def _mark(self, mail_id, 상태, attempts, error=None, next_try=0):
+        with get_connection() as conn:
+            conn.execute('''
+                UPDATE 메일발송함
+                SET 상태=?, 시도횟수=?, 오류=?, 다음시도=?,
+                    발송시각=CASE WHEN ?='완료' THEN CURRENT_TIMESTAMP ELSE 발송시각 END
+                WHERE id=?
+            ''', (상태, attempts, error, next_try, 상태, mail_id))
+            conn.commit()
+
+    def run(self):
+        _ensure_schema()
+        while not self._stop_event.is_set():
+            batch = self._claim_due()
+            if not batch:
+                if self._smtp is not None and time.monotonic() - self._last_used > IDLE_CLOSE_SECONDS:
+                    self._disconnect()
+                _wakeup.wait(POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+
+            for mail_id, to_email, subject, body, attempts in batch:
+                attempts += 1
+                try:
+                    with span("mail.send"):
+                        self._send(to_email, subject, body)
+                    self._mark(mail_id, "완료", attempts)
+                except Exception as e:
+                    self._disconnect()
+                    if attempts >= MAX_ATTEMPTS:
+                        self._mark(mail_id, "실패", attempts, str(e))
+                    else:
+                        delay = RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+                        self._mark(mail_id, "대기", attempts, str(e), time.time() + delay)
+
+        self._disconnect()
+
+
+def start_mail_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = MailWorker()
+            _worker.start()
+    return _worker
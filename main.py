@@ -1,13 +1,21 @@
+import sys
 import streamlit as st
+import profiling
 from datetime import datetime
 from auth import login_view, check_login
-from db import init_db
-from procedure import procedure_flow_view, get_procedure_flow, save_state_to_file
+from mailer import outbox_stats
+from notify import DIGEST_MINUTES, pending_digest_stats, send_digests
+from startup import ensure_started, startup_timings
+from db import (set_statement_tracer, pool_stats, query_cache_stats, save_stats, list_procedure_state_keys)
+from bulk_import import IMPORT_ROLES, bulk_import_view
+from workflow import WORKFLOW
+from procedure import procedure_flow_view, load_state, save_state, step_history_view
+from inbox import PARAM_KEYS, inbox_view, batch_complete_view
 
 st.set_page_config(page_title="현장비용 관리 시스템", layout="wide")
 st.title("🏗️ 관수이앤씨 현장비용 관리 시스템")
 
-init_db()
+ensure_started()
 
 # --- 🔒 로그인 제어 영역 ---
 if st.sidebar.button("🔒 로그아웃", use_container_width=True):
@@ -20,6 +28,59 @@ if not check_login():
 
 st.sidebar.success(f"✅ 로그인됨: {st.session_state.get('role')}")
 
+profiling.begin_rerun(st.session_state.get("user", ""))
+
+if st.session_state.get("role") == "관리자":
+    with st.sidebar.expander("🔌 DB 상태"):
+        st.caption("시작 소요 시간 (ms)")
+        st.json(startup_timings())
+        st.caption("커넥션 풀")
+        st.json(pool_stats())
+        st.caption("조회 캐시")
+        st.json(query_cache_stats())
+        st.caption("절차 상태 저장")
+        st.json(save_stats())
+        st.caption("메일 발송함")
+        st.json(outbox_stats())
+        if "chart_cache" in sys.modules:
+            st.caption("차트 캐시")
+            st.json(sys.modules["chart_cache"].chart_cache.stats())
+
+    with st.sidebar.expander("📨 알림 요약 메일"):
+        st.caption(f"부서별로 {DIGEST_MINUTES:g}분마다 한 통씩 발송")
+        pending = pending_digest_stats()
+        if pending:
+            st.dataframe([
+                {"부서": dept, "대기": count, "가장 오래된": datetime.fromtimestamp(oldest).strftime("%m-%d %H:%M")}
+                for dept, (count, oldest) in pending.items()
+            ], use_container_width=True, hide_index=True)
+        else:
+            st.caption("대기 중인 알림이 없습니다.")
+        if st.button("📤 지금 발송", disabled=not pending, key="digest_send_now"):
+            st.success(f"✅ 요약 메일 {send_digests(force=True)}통을 발송함에 넣었습니다.")
+
+    with st.sidebar.expander("⏱️ 리런 프로파일"):
+        if st.checkbox("프로파일링 사용", value=profiling.is_enabled(), key="profiling_enabled"):
+            if not profiling.is_enabled():
+                profiling.enable(True)
+                set_statement_tracer(profiling.count_statement)
+        elif profiling.is_enabled():
+            profiling.enable(False)
+            set_statement_tracer(None)
+
+        runs = profiling.recent_reruns(20)
+        if runs:
+            st.dataframe([
+                {"id": r["id"], "사용자": r["label"], "전체_ms": r["total_ms"],
+                 "쿼리수": r["queries"], "부분": r.get("fragment", False), "중단": r["interrupted"]}
+                for r in runs
+            ], use_container_width=True, hide_index=True)
+            run_id = st.selectbox("상세 보기", [r["id"] for r in runs], key="profiling_run")
+            record = next(r for r in runs if r["id"] == run_id)
+            st.dataframe(profiling.summarize_spans(record), use_container_width=True, hide_index=True)
+        else:
+            st.caption("기록된 리런이 없습니다.")
+
 # 이메일 전송 기능 토글
 st.sidebar.markdown("---")
 st.sidebar.header("📩 이메일 설정")
@@ -29,30 +90,39 @@ st.sidebar.checkbox("📧 이메일 알림 전송", value=True, key="email_enabl
 st.sidebar.markdown("---")
 st.sidebar.header("📂 입력 파라미터 선택")
 
-sites = ["화태백야", "제3연륙교"]
-site = st.sidebar.selectbox("현장명", sites)
-year = st.sidebar.text_input("연도", value=str(datetime.now().year))
-month = st.sidebar.selectbox("월", [f"{i:02d}" for i in range(1, 13)])
-cost_type = st.sidebar.selectbox("비용유형", list(get_procedure_flow().keys()))
+sites = list(WORKFLOW.sites)
+st.session_state.setdefault(PARAM_KEYS["year"], str(datetime.now().year))
+site = st.sidebar.selectbox("현장명", sites, key=PARAM_KEYS["site"])
+year = st.sidebar.text_input("연도", key=PARAM_KEYS["year"])
+month = st.sidebar.selectbox("월", [f"{i:02d}" for i in range(1, 13)], key=PARAM_KEYS["month"])
+cost_type = st.sidebar.selectbox("비용유형", WORKFLOW.cost_types_for(site), key=PARAM_KEYS["cost_type"])
 
 # --- 🧹 절차 초기화 섹션 ---
-st.sidebar.markdown("---")
-st.sidebar.header("🧹 절차 초기화 (개별)")
-
-if "절차상태" in st.session_state:
-    keys = list(st.session_state["절차상태"].keys())
-    if keys:
-        selected = st.sidebar.selectbox("초기화할 절차", keys, key="sidebar_reset")
-        if st.sidebar.button("선택한 절차 초기화", use_container_width=True):
-            st.session_state["절차상태"][selected]["current_step"] = 1
-            st.session_state["절차상태"][selected]["status"] = {
-                k: "진행중" for k in st.session_state["절차상태"][selected]["status"]
-            }
-            save_state_to_file()
-            st.sidebar.success(f"✅ 초기화 완료: {selected}")
-            st.rerun()
-    else:
-        st.sidebar.info("초기화할 절차가 없습니다.")
+@st.fragment
+def reset_panel(site, year, month):
+    """사이드바 초기화 섹션. 선택 변경은 이 부분만 다시 실행합니다."""
+    with profiling.fragment_run(f"{st.session_state.get('user', '')} · 초기화"):
+        st.markdown("---")
+        st.header("🧹 절차 초기화 (개별)")
+
+        # 선택한 현장·연도·월의 절차만 (키는 "현장명_연도_월_비용유형" 형식)
+        keys = list_procedure_state_keys(f"{site}_{year}_{month}_")
+        if not keys:
+            st.info(f"{site} {year}년 {month}월에 초기화할 절차가 없습니다.")
+            return
+        selected = st.selectbox("초기화할 절차", keys, key="sidebar_reset")
+        if st.button("선택한 절차 초기화", use_container_width=True):
+            reset_state = load_state(selected)
+            reset_state["current_step"] = 1
+            reset_state["status"] = {k: "진행중" for k in reset_state["status"]}
+            # 절차상태 단계 행과 단계 이력도 상태 저장과 같은 트랜잭션에서 되돌림
+            if save_state(selected, reset=True):
+                st.success(f"✅ 초기화 완료: {selected}")
+                # 절차 화면도 바뀌어야 하므로 전체 리런
+                st.rerun()
+
+with st.sidebar:
+    reset_panel(site, year, month)
 
 # --- ✅ 입력 유효성 검사 함수 ---
 def is_valid_inputs():
@@ -62,7 +132,7 @@ def is_valid_inputs():
     if site not in sites:
         st.sidebar.error("❌ 현장을 선택하세요")
         return False
-    if cost_type not in get_procedure_flow():
+    if cost_type not in WORKFLOW.cost_types_for(site):
         st.sidebar.error("❌ 유효한 비용 유형이 아닙니다.")
         return False
     return True
@@ -71,8 +141,29 @@ def is_valid_inputs():
 
 st.markdown("---")
 
+with st.expander("📥 내 작업함 (진행중 단계)"):
+    inbox_view(sites)
+
+with st.expander("✅ 단계 일괄 완료"):
+    batch_complete_view()
+
+@st.fragment
+def procedure_panel(site, year, month, cost_type):
+    """절차 진행 화면. 단계 상태·금액 입력은 이 부분만 다시 실행합니다."""
+    with profiling.fragment_run(f"{st.session_state.get('user', '')} · 절차"):
+        # 단계 상태는 절차 상태 저장과 같은 트랜잭션에서 기록되므로 따로 플러시하지 않음
+        procedure_flow_view(site, year, month, cost_type)
+        with st.expander("🕒 단계 이력"):
+            step_history_view(site, year, month, cost_type)
+
 if is_valid_inputs():
-    procedure_flow_view(site, year, month, cost_type)
+    procedure_panel(site, year, month, cost_type)
+
+st.markdown("---")
+
+if st.session_state.get("role") in IMPORT_ROLES:
+    with st.expander("📥 비용 일괄 업로드"):
+        bulk_import_view()
 
 st.markdown("---")
 
@@ -80,3 +171,5 @@ if st.checkbox("📊 결과 리포트 보기"):
     with st.container():
         from dashboard import summary_dashboard
         summary_dashboard()
+
+profiling.end_rerun()
@@ -0,0 +1,56 @@
+import argparse
+import sys
+
+import db
+
+
+def cmd_rebuild_summary(args):
+    db.init_db()
+    count = db.rebuild_monthly_summary()
+    print(f"✅ 월별요약 재계산 완료: {count}행")
+
+
+def cmd_verify_summary(args):
+    db.init_db()
+    mismatches = db.verify_monthly_summary()
+    if not mismatches:
+        print("✅ 월별요약이 원본 데이터와 일치합니다.")
+        return 0
+    for key, actual, expected in mismatches:
+        print(f"❌ {key}: 요약={actual} 원본={expected}")
+    print(f"불일치 {len(mismatches)}건 — 'python manage.py rebuild-summary'로 재계산하세요.")
+    return 1
+
+
+def cmd_archive_year(args):
+    db.init_db()
+    try:
+        moved = db.archive_year(args.year)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ {args.year}년 {moved}행을 {db.archive_path(args.year)}로 옮겼습니다.")
+    if args.vacuum:
+        with db.get_connection() as conn:
+            conn.execute("VACUUM")
+        print("✅ 운영 DB 정리(VACUUM) 완료")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="현장비용 관리 시스템 관리 명령")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("rebuild-summary", help="월별요약 테이블을 절차상태에서 다시 계산").set_defaults(func=cmd_rebuild_summary)
+    sub.add_parser("verify-summary", help="월별요약과 원본 집계 비교").set_defaults(func=cmd_verify_summary)
+
+    archive = sub.add_parser("archive-year", help="마감 연도를 연도별 보관 DB로 이동")
+    archive.add_argument("year")
+    archive.add_argument("--vacuum", action="store_true", help="이동 후 운영 DB 파일 크기 줄이기")
+    archive.set_defaults(func=cmd_archive_year)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
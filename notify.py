@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from db import get_connection, retry_on_busy, write_transaction
+from mailer import add_to_outbox, wake_worker
+from profiling import timed
+from workflow import WORKFLOW
+
+DEPARTMENT_EMAILS = {
+    "현장": "beon333@kwansoo.biz",
+    "본사 공무팀": "jaewon@kwansoo.biz",
+    "경영지원부": "samin@kwansoo.biz"
+}
+
+# 부서별 요약 메일 주기(분). 0이면 다음 확인 때 바로 발송
+DIGEST_MINUTES = float(os.environ.get("SCM_DIGEST_MINUTES", "30"))
+CHECK_INTERVAL = 60.0        # 발송할 요약이 있는지 확인하는 주기(초)
+
+logger = logging.getLogger("site_cost.notify")
+
+_schema_ready = False
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def _ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with get_connection() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS 알림이벤트 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                이벤트키 TEXT NOT NULL UNIQUE,
+                부서 TEXT NOT NULL,
+                내용 TEXT NOT NULL,
+                생성시각 REAL NOT NULL,
+                요약id INTEGER
+            )
+        ''')
+        # 아직 요약에 묶이지 않은 이벤트만 담는 부분 인덱스
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_알림이벤트_대기
+            ON 알림이벤트 (부서, 생성시각) WHERE 요약id IS NULL
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS 알림요약 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                부서 TEXT NOT NULL,
+                수신자 TEXT NOT NULL,
+                건수 INTEGER NOT NULL,
+                생성시각 REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+    _schema_ready = True
+
+
+def transition_events(site, year, month, cost_type, step_no, event_key=None):
+    """step_no 단계 완료로 생기는 (이벤트키, 부서, 내용) 목록.
+
+    다음 단계가 있으면 그 담당 부서에, 마지막 단계였다면 모든 부서에 하나씩 만듭니다.
+    event_key가 같은 이벤트는 한 번만 기록되므로 같은 전이를 다시 기록해도 메일은 한 통입니다.
+    """
+    event_key = event_key or uuid.uuid4().hex
+    period = f"{site} / {year}년 {month}월 / {cost_type}"
+    current = WORKFLOW.step(cost_type, step_no)
+    next_no = WORKFLOW.next_step(cost_type, step_no)
+    if next_no is None:
+        text = f"{period}: 모든 절차 완료"
+        return [(f"{event_key}:{dept}", dept, text) for dept in DEPARTMENT_EMAILS]
+    next_def = WORKFLOW.step(cost_type, next_no)
+    text = f"{period}: '{current.task}' 완료 → 다음 단계 '{next_def.task}'"
+    return [(f"{event_key}:{next_def.dept}", next_def.dept, text)]
+
+
+def batch_events(cost_type, step_no, completed):
+    """일괄 완료된 절차 (현장명, 연도, 월) 목록의 전이 이벤트."""
+    batch_key = uuid.uuid4().hex
+    return [event
+            for site, year, month in completed
+            for event in transition_events(site, year, month, cost_type, step_no,
+                                           f"{site}_{year}_{month}_{cost_type}:{step_no}:{batch_key}")]
+
+
+@timed("notify.record_events")
+@retry_on_busy
+def record_events(events):
+    """알림 이벤트를 요약 대기열에 추가합니다. 새로 추가된 수를 반환합니다."""
+    _ensure_schema()
+    events = [e for e in events if e[1] in DEPARTMENT_EMAILS]
+    if not events:
+        return 0
+    now = time.time()
+    with write_transaction() as conn:
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT OR IGNORE INTO 알림이벤트 (이벤트키, 부서, 내용, 생성시각)
+            VALUES (?, ?, ?, ?)
+        ''', [(key, dept, text, now) for key, dept, text in events])
+        added = conn.total_changes - before
+    return added
+
+
+def pending_digest_stats():
+    """부서별 (대기 이벤트 수, 가장 오래된 이벤트 시각)."""
+    _ensure_schema()
+    with get_connection() as conn:
+        rows = conn.execute('''
+            SELECT 부서, COUNT(*), MIN(생성시각) FROM 알림이벤트
+            WHERE 요약id IS NULL GROUP BY 부서
+        ''').fetchall()
+    return {dept: (count, oldest) for dept, count, oldest in rows}
+
+
+def _digest_body(dept, lines):
+    listed = "\n".join(f"- {line}" for line in lines)
+    return f"""{dept} 담당 알림 {len(lines)}건입니다.
+
+{listed}
+"""
+
+
+@timed("notify.send_digests")
+@retry_on_busy
+def send_digests(force=False):
+    """주기가 된 부서(force=True면 전부)의 대기 이벤트를 요약 메일 한 통으로 묶어 발송함에 넣습니다.
+
+    이벤트를 요약에 묶는 것과 발송함 추가를 한 트랜잭션에서 하므로 각 이벤트는 정확히 한 번만 발송됩니다.
+    발송함에 넣은 요약 메일 수를 반환합니다.
+    """
+    _ensure_schema()
+    cutoff = time.time() - DIGEST_MINUTES * 60
+    sent = 0
+    with write_transaction() as conn:
+        due = conn.execute('''
+            SELECT 부서 FROM 알림이벤트 WHERE 요약id IS NULL
+            GROUP BY 부서 HAVING ? OR MIN(생성시각) <= ?
+        ''', (force, cutoff)).fetchall()
+        for (dept,) in due:
+            events = conn.execute('''
+                SELECT id, 내용 FROM 알림이벤트
+                WHERE 부서=? AND 요약id IS NULL ORDER BY id
+            ''', (dept,)).fetchall()
+            to_email = DEPARTMENT_EMAILS[dept]
+            digest_id = conn.execute('''
+                INSERT INTO 알림요약 (부서, 수신자, 건수, 생성시각) VALUES (?, ?, ?, ?)
+            ''', (dept, to_email, len(events), time.time())).lastrowid
+            conn.executemany("UPDATE 알림이벤트 SET 요약id=? WHERE id=?",
+                             [(digest_id, event_id) for event_id, _ in events])
+            subject = f"[알림 요약] {dept} 담당 {len(events)}건"
+            add_to_outbox(conn, to_email, subject, _digest_body(dept, [text for _, text in events]),
+                          dedup_key=f"요약:{digest_id}")
+            sent += 1
+    if sent:
+        wake_worker()
+    return sent
+
+
+class DigestScheduler(threading.Thread):
+    """주기적으로 send_digests()를 호출하는 백그라운드 스레드."""
+
+    def __init__(self, interval=CHECK_INTERVAL):
+        super().__init__(name="notify-digest", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                send_digests()
+            except Exception:
+                logger.exception("알림 요약 발송 실패")
+
+
+def start_digest_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = DigestScheduler()
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,117 @@
+from db import cached_query, get_connection, summary_source
+from profiling import timed
+
+# 집계 단위별 (기간 순번 식, 기간 라벨 식, 1년당 기간 수)
+# 기간 순번은 연속된 정수라서 RANGE 프레임으로 누계·전년 동기 값을 바로 구할 수 있음
+GRAINS = {
+    "month": ("연도 * 12 + 월 - 1", "printf('%04d-%02d', 연도, 월)", 12),
+    "quarter": ("연도 * 4 + (월 - 1) / 3", "printf('%04d-Q%d', 연도, (월 - 1) / 3 + 1)", 4),
+    "year": ("연도", "printf('%04d', 연도)", 1),
+    "rolling12": ("연도 * 12 + 월 - 1", "printf('%04d-%02d', 연도, 월)", 12),
+}
+
+AMOUNT_COLUMNS = ["기성금", "노무비", "투입비"]
+
+ROLLUP_COLUMNS = (
+    ["현장명", "비용유형", "기간"]
+    + AMOUNT_COLUMNS
+    + [f"{c}누계" for c in AMOUNT_COLUMNS]
+    + [f"전년{c}" for c in AMOUNT_COLUMNS]
+)
+
+
+def _rollup_sql(grain, site, cost_type, by_cost_type, source="월별요약"):
+    idx_expr, label_expr, per_year = GRAINS[grain]
+
+    where, params = [], []
+    if site is not None:
+        where.append("현장명 = ?")
+        params.append(site)
+    if cost_type is not None:
+        where.append("비용유형 = ?")
+        params.append(cost_type)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    part = "현장명, 비용유형" if by_cost_type else "현장명"
+    cost_type_col = "비용유형" if by_cost_type else "NULL"
+
+    if grain == "rolling12":
+        values = ", ".join(
+            f"SUM({c}) OVER (PARTITION BY {part} ORDER BY 기간순번 RANGE BETWEEN 11 PRECEDING AND CURRENT ROW) AS {c}"
+            for c in AMOUNT_COLUMNS
+        )
+    else:
+        values = ", ".join(AMOUNT_COLUMNS)
+
+    # 누계는 rolling12에서도 이동 합계가 아닌 기간별 원래 합계를 누적
+    raw = ", ".join(f"{c} AS 기간{c}" for c in AMOUNT_COLUMNS)
+    cumulative = ", ".join(f"SUM(기간{c}) OVER w_cum AS {c}누계" for c in AMOUNT_COLUMNS)
+    previous = ", ".join(f"SUM({c}) OVER w_prev AS 전년{c}" for c in AMOUNT_COLUMNS)
+    sums = ", ".join(f"SUM({c}) AS {c}" for c in AMOUNT_COLUMNS)
+
+    sql = f'''
+        WITH base AS (
+            SELECT 현장명, 비용유형, CAST(연도 AS INTEGER) AS 연도, CAST(월 AS INTEGER) AS 월,
+                   {", ".join(AMOUNT_COLUMNS)}
+            FROM {source}
+            {where_sql}
+        ),
+        periods AS (
+            SELECT {part}, {idx_expr} AS 기간순번, {label_expr} AS 기간, {sums}
+            FROM base
+            GROUP BY {part}, 기간순번
+        ),
+        vals AS (
+            SELECT {part}, 기간순번, 기간, {values}, {raw}
+            FROM periods
+        )
+        SELECT 현장명, {cost_type_col} AS 비용유형, 기간, {", ".join(AMOUNT_COLUMNS)},
+               {cumulative}, {previous}
+        FROM vals
+        WINDOW w_cum AS (PARTITION BY {part} ORDER BY 기간순번 ROWS UNBOUNDED PRECEDING),
+               w_prev AS (PARTITION BY {part} ORDER BY 기간순번
+                          RANGE BETWEEN {per_year} PRECEDING AND {per_year} PRECEDING)
+        ORDER BY {part}, 기간순번
+    '''
+    return sql, params
+
+
+@timed("db.fetch_period_rollup")
+@cached_query()
+def fetch_period_rollup(site=None, grain="month", cost_type=None, by_cost_type=False,
+                        include_archived=False):
+    """현장별 기간 집계를 반환합니다. 행 구성은 ROLLUP_COLUMNS 순서를 따릅니다.
+
+    grain: "month" | "quarter" | "year" | "rolling12"
+    누계와 전년 동기 값은 SQLite 윈도 함수로 계산하며, 전년 데이터가 없으면 None입니다.
+    include_archived=True이면 보관된 연도 DB도 함께 집계합니다.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"지원하지 않는 집계 단위입니다: {grain}")
+    with summary_source(None if include_archived else ()) as (conn, source):
+        sql, params = _rollup_sql(grain, site, cost_type, by_cost_type, source)
+        return conn.execute(sql, params).fetchall()
+
+
+@cached_query()
+def fetch_site_names(include_archived=False):
+    with summary_source(None if include_archived else ()) as (conn, source):
+        return [row[0] for row in conn.execute(f"SELECT DISTINCT 현장명 FROM {source} ORDER BY 현장명")]
+
+
+@cached_query()
+def fetch_years(site=None, include_archived=False):
+    """데이터가 있는 연도 목록. site를 주면 해당 현장만 (기본키 앞부분으로 바로 찾음)."""
+    where, params = ("WHERE 현장명 = ?", (site,)) if site is not None else ("", ())
+    with summary_source(None if include_archived else ()) as (conn, source):
+        return [row[0] for row in conn.execute(
+            f"SELECT DISTINCT 연도 FROM {source} {where} ORDER BY 연도", params
+        )]
+
+
+@cached_query()
+def fetch_months(site, year):
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT DISTINCT 월 FROM 월별요약 WHERE 현장명 = ? AND 연도 = ? ORDER BY 월", (site, year)
+        )]
@@ -1,105 +1,75 @@
 import streamlit as st
-import pandas as pd
-import json
-import os
-import smtplib
-from email.mime.text import MIMEText
-from db import update_step_status, get_connection
+from auth import is_authorized
+from workflow import WORKFLOW
+from notify import record_events, transition_events
+from db import (load_procedure_state, save_procedure_state, procedure_state_version,
+                record_step_events, fetch_step_events, fetch_cost_entries,
+                VersionConflict)
+from datetime import datetime
 
 SAVE_PATH = "절차상태저장.json"
 
-COST_INPUT_CONDITIONS = {
-    ("2. 기성금 청구 및 수금", 3): "기성금",
-    ("3. 노무 및 협력업체 지급 및 투입비 입력", 3): "노무비",
-    ("3. 노무 및 협력업체 지급 및 투입비 입력", 5): "투입비"
-}
-
-DEPARTMENT_EMAILS = {
-    "현장": "beon333@kwansoo.biz",
-    "본사 공무팀": "jaewon@kwansoo.biz",
-    "경영지원부": "samin@kwansoo.biz"
-}
-
-def send_email(to_email, subject, body):
-    from_email = "sjwgood9120@gmail.com"
-    password = "vbyn gkhk wrnr lorf"  # ← 앱 비밀번호 (띄어쓰기 없이 붙여넣기)
-
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = from_email
-    msg["To"] = to_email
-
-    st.write("📧 [DEBUG] 메일 발송 대상:", to_email)  # ✅ 안전한 디버깅 로그만 남김
+# (비용유형, 단계번호) → 금액 항목. 절차 정의는 workflow.json에서 한 번만 컴파일됨
+COST_INPUT_CONDITIONS = WORKFLOW.cost_columns
 
+def notify_transition(site, year, month, cost_type, step_no, event_key):
+    """단계 전이를 부서별 요약 메일 대기열에 기록합니다. 같은 event_key는 한 번만 기록됩니다."""
+    if not st.session_state.get("email_enabled", True):
+        return
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(from_email, password)
-            server.send_message(msg)
-        st.success(f"📧 이메일 전송 완료 → {to_email}")
+        if record_events(transition_events(site, year, month, cost_type, step_no, event_key)):
+            st.toast("📨 담당 부서 요약 메일에 추가되었습니다.")
     except Exception as e:
-        st.error(f"📛 이메일 전송 실패: {e}")
+        st.error(f"📛 알림 기록 실패: {e}")
 
 def get_procedure_flow():
+    return WORKFLOW.flows
+
+def new_procedure_state(cost_type):
+    steps = get_procedure_flow()[cost_type]
     return {
-        "1. 계약(변경)체결": [
-            ("계약(변경)보고", "현장"),
-            ("계약(변경)확인", "본사 공무팀"),
-            ("계약 승인 요청 접수", "현장"),
-            ("계약 진행 요청", "본사 공무팀"),
-            ("보증 등 발행 협력사 등록", "경영지원부"),
-            ("Kiscon사이트 등록", "본사 공무팀")
-        ],
-        "2. 기성금 청구 및 수금": [
-            ("기성조서 작성", "현장"),
-            ("예상 기성 확인", "본사 공무팀"),
-            ("기성 확정", "현장"),
-            ("발행 요청 확인", "본사 공무팀"),
-            ("계산서 발행 및 협력사 등록", "경영지원부"),
-            ("기성 금액 수금", "경영지원부"),
-            ("Kiscon 등록", "본사 공무팀")
-        ],
-        "3. 노무 및 협력업체 지급 및 투입비 입력": [
-            ("노무대장 작성", "현장"),
-            ("노무대장 확인", "본사 공무팀"),
-            ("노무비 신고", "경영지원부"),
-            ("보험료 확정분 및 노무대장 작성", "경영지원부"),
-            ("하도급지킴이 등록", "현장"),
-            ("하도급지킴이 확인", "본사 공무팀"),
-            ("하도급지킴이 지급 확인,지급", "경영지원부")
-        ],
-        "4. 선금(외 기타)보증": [
-            ("선금 공문 접수", "현장"),
-            ("선금 공문 보고", "본사 공무팀"),
-            ("선금신청 및 공문회신", "본사 공무팀"),
-            ("보증 등 발행 협력사 등록", "경영지원부"),
-            ("원도급사 통보 Kiscon 등록", "본사 공무팀")
-        ]
+        "current_step": 1,
+        "status": {label: "진행중" for label, _ in steps},
+        "amounts": {},
+        "total_steps": len(steps)
     }
 
-def save_state_to_file():
-    with open(SAVE_PATH, "w", encoding="utf-8") as f:
-        json.dump(st.session_state.절차상태, f, ensure_ascii=False, indent=2)
-
-def load_state_from_file():
-    if os.path.exists(SAVE_PATH):
-        with open(SAVE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+def load_state(key):
+    """세션에 없거나 다른 사용자가 바꿔 버전이 달라진 절차 상태만 DB에서 읽어 옵니다."""
+    if "절차상태" not in st.session_state:
+        st.session_state.절차상태 = {}
+    cached = st.session_state.절차상태.get(key)
+    if cached is None or cached.get("version") != procedure_state_version(key):
+        state = load_procedure_state(key)
+        if state is not None:
+            st.session_state.절차상태[key] = state
+        else:
+            # 다른 화면에서 삭제·보관된 절차
+            st.session_state.절차상태.pop(key, None)
+    return st.session_state.절차상태.get(key)
+
+def save_state(key, **writes):
+    """세션의 절차 상태를 버전 비교 후 저장합니다. 충돌하면 최신 상태로 되돌리고 False를 반환합니다.
+
+    writes(단계 상태·금액·단계 완료)는 상태 저장과 같은 트랜잭션에서 기록되어 충돌 시 함께 버려집니다.
+    """
+    try:
+        save_procedure_state(key, st.session_state.절차상태[key], **writes)
+        return True
+    except VersionConflict:
+        latest = load_procedure_state(key)
+        if latest is not None:
+            st.session_state.절차상태[key] = latest
+        st.error("⚠️ 다른 사용자가 먼저 이 절차를 변경했습니다. 최신 상태를 불러왔으니 확인 후 다시 시도하세요.")
+        return False
 
 def procedure_flow_view(site, year, month, cost_type):
     key = f"{site}_{year}_{month}_{cost_type}"
 
-    if "절차상태" not in st.session_state:
-        st.session_state.절차상태 = load_state_from_file()
-
-    if key not in st.session_state.절차상태:
-        steps = get_procedure_flow()[cost_type]
-        st.session_state.절차상태[key] = {
-            "current_step": 1,
-            "status": {label: "진행중" for label, _ in steps},
-            "amounts": {},
-            "total_steps": len(steps)
-        }
+    if load_state(key) is None:
+        st.session_state.절차상태[key] = new_procedure_state(cost_type)
+        if save_state(key):
+            record_step_events([(site, year, month, cost_type, 1, "시작")])
 
     state = st.session_state.절차상태[key]
     steps = get_procedure_flow()[cost_type]
@@ -110,18 +80,6 @@ def procedure_flow_view(site, year, month, cost_type):
 
     if current_index >= len(steps):
         st.success("🎉 모든 단계가 완료되었습니다.")
-
-        if st.session_state.get("email_enabled", True):
-            subject = f"[완료 알림] '{site}'의 '{cost_type}' 절차 전체 완료"
-            body = f"""{site} 현장의 비용유형 '{cost_type}'에 대한 모든 절차가 완료되었습니다.
-
-- 연도: {year}
-- 월: {month}
-- 비용유형: {cost_type}
-"""
-            for dept, to_email in DEPARTMENT_EMAILS.items():
-                send_email(to_email, subject, body)
-
         return
 
     if current_index >= len(steps):
@@ -138,21 +96,13 @@ def procedure_flow_view(site, year, month, cost_type):
         st.success("🎉 모든 단계가 완료되었습니다.")
 
     my_role = st.session_state.get("role", "")
-    is_authorized = (my_role == 담당부서 or my_role == "관리자")
 
-    if is_authorized:
+    if is_authorized(my_role, 담당부서):
         상태 = st.radio("진행 상태", ["진행중", "완료"],
                         index=0 if state["status"][current_step] == "진행중" else 1)
+        state_changed = state["status"][current_step] != 상태
         state["status"][current_step] = 상태
-
-        update_step_status(
-            site=site,
-            year=year,
-            month=month,
-            cost_type=cost_type,
-            step_no=state["current_step"],
-            상태=상태
-        )
+        cell = (site, year, f"{int(month):02d}", cost_type, state["current_step"])
 
         cost_key = (cost_type, state["current_step"])
         if cost_key in COST_INPUT_CONDITIONS:
@@ -160,46 +110,33 @@ def procedure_flow_view(site, year, month, cost_type):
             current_value = state["amounts"].get(label, 0)
             입력값 = st.number_input(f"💰 {label} 입력", min_value=0, step=100000, value=current_value)
 
-            actual_step_no = None
-            for (cond_type, cond_step), cond_label in COST_INPUT_CONDITIONS.items():
-                if cond_label == label and cond_type == cost_type:
-                    actual_step_no = cond_step
-                    break
+            actual_step_no = WORKFLOW.cost_label_steps[(cost_type, label)]
 
             if st.button(f"💾 {label} 저장"):
+                amount_changed = state["amounts"].get(label) != 입력값
                 state["amounts"][label] = 입력값
 
-                steps_all = get_procedure_flow()[cost_type]
-                step_label, step_dept = steps_all[actual_step_no - 1]
-
-                with get_connection() as conn:
-                    conn.execute("""
-                        INSERT OR IGNORE INTO 절차상태
-                        (현장명, 연도, 월, 비용유형, 단계번호, 작업내용, 담당부서)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """, (site, year, month, cost_type, actual_step_no, step_label, step_dept))
-
-                update_step_status(
-                    site=site,
-                    year=year,
-                    month=month,
-                    cost_type=cost_type,
-                    step_no=actual_step_no,
-                    상태=상태,
-                    금액컬럼=label,
-                    금액=입력값
-                )
-
-                save_state_to_file()
-                st.success(f"✅ {label}이 DB에 저장되었습니다.")
-                st.rerun()
+                # 단계 상태·금액은 절차 상태 저장(버전 비교)에 성공할 때만 함께 기록됨.
+                # 바뀐 것만 넘기므로 아무것도 바뀌지 않았으면 DB에 쓰지 않음
+                if save_state(key, cells={cell: 상태} if state_changed else None,
+                              amounts=[(*cell[:4], actual_step_no, label, 입력값)] if amount_changed else (),
+                              입력자=st.session_state.get("user", "")):
+                    st.success(f"✅ {label}이 DB에 저장되었습니다.")
+                    st.rerun()
+                return
 
             if label in state["amounts"]:
                 st.info(f"💾 저장된 {label}: {state['amounts'][label]:,}원")
             else:
                 st.warning(f"❗ 아직 {label}이 저장되지 않았습니다.")
 
-        save_state_to_file()
+        if state_changed:
+            if not save_state(key, cells={cell: 상태}):
+                return
+            if 상태 == "완료" and WORKFLOW.next_step(cost_type, state["current_step"]) is None:
+                # 마지막 단계 완료로 모든 단계가 끝남. 키에 버전을 넣어 초기화 후 다시 완료해도 알림이 감
+                notify_transition(site, year, month, cost_type, state["current_step"],
+                                  f"{key}:완료:v{state['version']}")
     else:
         st.warning("⚠️ 이 단계는 귀하의 담당 부서가 아닙니다. 수정 권한이 없습니다.")
 
@@ -211,33 +148,36 @@ def procedure_flow_view(site, year, month, cost_type):
                 st.warning(f"⚠️ {label}을 저장한 뒤에 다음 단계로 이동할 수 있습니다.")
                 return
 
-        if st.button("다음 단계로 이동"):
-            if state["current_step"] < state["total_steps"]:
-                state["current_step"] += 1
-                save_state_to_file()
-
-                next_step, next_dept = steps[state["current_step"] - 1]
-                to_email = DEPARTMENT_EMAILS.get(next_dept)
-                if to_email and st.session_state.get("email_enabled", True):
-                    subject = f"[알림] '{site}' 현장 절차 알림"
-                    body = f"""{site} 현장의 '{current_step}' 단계가 완료되었습니다.\n\n귀 부서에서 담당하는 다음 단계는 '{next_step}'입니다.\n\n- 연도: {year} / 월: {month}\n- 비용유형: {cost_type}"""
-                    send_email(to_email, subject, body)
-
-                st.rerun()
-            else:
-                st.success("🎉 모든 단계가 완료되었습니다.")
-                if st.session_state.get("email_enabled", True):
-                    subject = f"[완료 알림] '{site}'의 '{cost_type}' 절차 전체 완료"
-                    body = f"""{site} 현장의 비용유형 '{cost_type}'에 대한 모든 절차가 완료되었습니다.
-
-- 연도: {year}
-- 월: {month}
-- 비용유형: {cost_type}
-"""
-                    for dept, to_email in DEPARTMENT_EMAILS.items():
-                        send_email(to_email, subject, body)
-
-                save_state_to_file()
-                st.rerun()
+        # 마지막 단계는 완료로 저장하는 것으로 절차가 끝나므로 더 이동할 단계가 없음
+        next_no = WORKFLOW.next_step(cost_type, state["current_step"])
+        if st.button("다음 단계로 이동", disabled=next_no is None):
+            state["current_step"] = next_no
+            if not save_state(key, complete=(site, year, f"{int(month):02d}", cost_type, next_no - 1)):
+                return
+            notify_transition(site, year, month, cost_type, next_no - 1,
+                              f"{key}:{next_no - 1}:v{state['version']}")
+            st.rerun()
     else:
         st.button("다음 단계로 이동", disabled=True)
+
+def step_history_view(site, year, month, cost_type):
+    """절차의 단계 전이·금액 입력 이력. 절차 키 인덱스로 이 절차 것만 읽습니다."""
+    entries = fetch_cost_entries(site, year, month, cost_type)
+    if entries:
+        st.caption("금액 입력 (정정은 이전 합계와의 차액으로 기록)")
+        st.dataframe([
+            {"시각": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M"),
+             "단계": step_no, "비용항목": label, "금액": f"{amount:+,}", "입력자": user or "-"}
+            for step_no, label, amount, user, ts in entries
+        ], use_container_width=True, hide_index=True)
+
+    events = fetch_step_events(site, year, month, cost_type)
+    if not events:
+        st.caption("기록된 단계 전이가 없습니다.")
+        return
+    st.caption("단계 전이")
+    st.dataframe([
+        {"시각": datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M"),
+         "단계": str(step_no) if step_no else "-", "담당부서": dept or "-", "이벤트": event}
+        for step_no, dept, event, ts in events
+    ], use_container_width=True, hide_index=True)
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+# SCM_PROFILE=1 로 켜거나 관리자 사이드바에서 켤 수 있음. 꺼져 있으면 플래그 확인만 하고 바로 반환
+_enabled = os.environ.get("SCM_PROFILE", "0") == "1"
+SLOW_CALL_MS = float(os.environ.get("SCM_SLOW_QUERY_MS", "200"))
+EXPORT_PATH = os.environ.get("SCM_PROFILE_EXPORT")   # JSON-lines 내보내기 경로 (선택)
+HISTORY_SIZE = 50
+
+logger = logging.getLogger("site_cost.profile")
+
+_local = threading.local()
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+_export_lock = threading.Lock()
+_run_counter = 0
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+
+def begin_rerun(label=""):
+    """현재 스레드의 스크립트 실행 기록을 시작합니다. 끝나지 않은 이전 기록은 먼저 마감합니다."""
+    global _run_counter
+    if not _enabled:
+        return
+    if getattr(_local, "run", None) is not None:
+        end_rerun(interrupted=True)
+    with _history_lock:
+        _run_counter += 1
+        run_id = _run_counter
+    _local.run = {
+        "id": run_id,
+        "label": label,
+        "started_at": time.time(),
+        "start": time.perf_counter(),
+        "queries": 0,
+        "spans": [],
+    }
+
+
+def end_rerun(interrupted=False):
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    record = {
+        "id": run["id"],
+        "label": run["label"],
+        "started_at": run["started_at"],
+        "total_ms": round((time.perf_counter() - run["start"]) * 1000, 3),
+        "queries": run["queries"],
+        "interrupted": interrupted,
+        "fragment": run.get("fragment", False),
+        "spans": run["spans"],
+    }
+    with _history_lock:
+        _history.append(record)
+    if EXPORT_PATH:
+        with _export_lock, open(EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return record
+
+
+@contextmanager
+def fragment_run(label=""):
+    """st.fragment 단독 리런도 하나의 기록으로 남깁니다. 전체 리런 도중이면 그 기록에 포함됩니다."""
+    if not _enabled or getattr(_local, "run", None) is not None:
+        yield
+        return
+    begin_rerun(label)
+    _local.run["fragment"] = True
+    try:
+        yield
+    finally:
+        end_rerun()
+
+
+def _record(name, elapsed):
+    elapsed_ms = elapsed * 1000
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["spans"].append((name, round(elapsed_ms, 3)))
+    if elapsed_ms >= SLOW_CALL_MS:
+        logger.warning("느린 호출 %s: %.1fms", name, elapsed_ms)
+
+
+@contextmanager
+def span(name):
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def timed(name):
+    """함수 호출 시간을 현재 리런 기록에 남기는 데코레이터."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count_statement(sql):
+    """db.set_statement_tracer()에 넘기는 SQL 실행 카운터."""
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["queries"] += 1
+
+
+def recent_reruns(limit=HISTORY_SIZE):
+    with _history_lock:
+        return list(_history)[-limit:][::-1]
+
+
+def summarize_spans(record):
+    """리런 하나의 구간을 이름별 (호출 수, 합계 ms)로 묶어 합계가 큰 순서로 반환합니다."""
+    totals = {}
+    for name, ms in record["spans"]:
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + 1, total + ms)
+    return sorted(
+        ({"구간": name, "호출수": count, "합계_ms": round(total, 3)} for name, (count, total) in totals.items()),
+        key=lambda row: row["합계_ms"],
+        reverse=True,
+    )
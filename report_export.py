@@ -0,0 +1,137 @@
+import csv
+import os
+import tempfile
+from datetime import datetime
+
+import streamlit as st
+
+from db import iter_summary_rows
+from profiling import timed
+
+EXPORT_COLUMNS = ["현장명", "연도", "월", "기성금", "노무비", "투입비", "현장손익(기성금-투입비)", "손익율(%)"]
+PDF_ROWS_PER_PAGE = 35
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "PDF": (".pdf", "application/pdf"),
+}
+
+
+def iter_report_rows(site=None, start=None, end=None):
+    """리포트 한 줄씩: 금액 컬럼 뒤에 손익과 손익율을 붙여 돌려줍니다."""
+    for 현장명, 연도, 월, 기성금, 노무비, 투입비 in iter_summary_rows(site, start, end):
+        기성금, 노무비, 투입비 = 기성금 or 0, 노무비 or 0, 투입비 or 0
+        손익 = 기성금 - 투입비
+        손익율 = round(손익 / 기성금 * 100, 2) if 기성금 else None
+        yield (현장명, 연도, 월, 기성금, 노무비, 투입비, 손익, 손익율)
+
+
+def write_csv(rows, path):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_xlsx(rows, path):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("현장별 비용 리포트")
+    ws.append(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        ws.append(row)
+        count += 1
+    wb.save(path)
+    return count
+
+
+def _pdf_page(pdf, title, page_no, rows):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(11.69, 8.27))  # A4 가로
+    ax.axis("off")
+    ax.set_title(f"{title}  (p.{page_no})", fontsize=12, loc="left")
+    cells = [
+        [site, year, month, f"{a:,}", f"{b:,}", f"{c:,}", f"{p:,}", "-" if r is None else f"{r:.2f}"]
+        for site, year, month, a, b, c, p, r in rows
+    ]
+    table = ax.table(cellText=cells, colLabels=EXPORT_COLUMNS, loc="upper center", cellLoc="right")
+    table.auto_set_font_size(False)
+    table.set_fontsize(8)
+    table.scale(1, 1.3)
+    pdf.savefig(fig)
+    plt.close(fig)
+
+
+def write_pdf(rows, path, title="현장별 비용 리포트"):
+    from matplotlib.backends.backend_pdf import PdfPages
+    from startup import ensure_font
+
+    ensure_font()
+    count, page_no, page = 0, 0, []
+    with PdfPages(path) as pdf:
+        for row in rows:
+            page.append(row)
+            count += 1
+            if len(page) == PDF_ROWS_PER_PAGE:
+                page_no += 1
+                _pdf_page(pdf, title, page_no, page)
+                page = []
+        if page or page_no == 0:
+            _pdf_page(pdf, title, page_no + 1, page)
+    return count
+
+
+WRITERS = {"CSV": write_csv, "XLSX": write_xlsx, "PDF": write_pdf}
+
+
+@timed("export.build")
+def build_export(fmt, site=None, start=None, end=None):
+    """리포트를 임시 파일로 스트리밍 기록하고 (경로, 행 수)를 반환합니다."""
+    suffix, _ = FORMATS[fmt]
+    fd, path = tempfile.mkstemp(prefix="site-cost-report-", suffix=suffix)
+    os.close(fd)
+    try:
+        count = WRITERS[fmt](iter_report_rows(site, start, end), path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, count
+
+
+def _period_input(label, default_year, default_month, key):
+    col1, col2 = st.columns(2)
+    year = col1.number_input(f"{label} 연도", 2000, 2100, default_year, key=f"{key}_year")
+    month = col2.selectbox(f"{label} 월", list(range(1, 13)), index=default_month - 1, key=f"{key}_month")
+    return (str(year), f"{month:02d}")
+
+
+@st.fragment
+def export_view(sites):
+    now = datetime.now()
+    site = st.selectbox("현장", ["전체 현장"] + list(sites), key="export_site")
+    start = _period_input("시작", now.year, 1, "export_start")
+    end = _period_input("종료", now.year, 12, "export_end")
+    fmt = st.radio("형식", list(FORMATS), horizontal=True, key="export_format")
+
+    if st.button("📄 파일 생성", key="export_build"):
+        old = st.session_state.pop("export_file", None)
+        if old and os.path.exists(old[0]):
+            os.remove(old[0])
+        with st.spinner("리포트 생성 중..."):
+            path, count = build_export(fmt, None if site == "전체 현장" else site, start, end)
+        name = f"현장비용리포트_{site}_{start[0]}{start[1]}-{end[0]}{end[1]}{FORMATS[fmt][0]}"
+        st.session_state["export_file"] = (path, name, FORMATS[fmt][1], count)
+
+    export = st.session_state.get("export_file")
+    if export and os.path.exists(export[0]):
+        path, name, mime, count = export
+        st.caption(f"{count:,}행")
+        with open(path, "rb") as f:
+            st.download_button("⬇️ 다운로드", f, file_name=name, mime=mime, key="export_download")
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import profiling
+from db import init_db, migrate_state_file, set_statement_tracer
+
+FONT_PATH = os.path.join(os.path.dirname(__file__), "assets", "NanumGothicLight.ttf")
+
+_lock = threading.Lock()
+_font_lock = threading.Lock()
+_started = False
+_font_name = None
+_font_error = None
+_font_done = False
+_timings = OrderedDict()   # 단계명 → 소요 시간(초)
+
+
+def _timed(name, func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        _timings[name] = time.perf_counter() - start
+
+
+def ensure_started():
+    """프로세스당 한 번만 스키마 준비, 상태 파일 이전, 메일 워커·요약 스케줄러 시작, 무거운 모듈 예열을 수행합니다."""
+    global _started
+    if _started:
+        return
+    with _lock:
+        if _started:
+            return
+        from procedure import SAVE_PATH
+        from mailer import start_mail_worker
+        from notify import start_digest_scheduler
+
+        if profiling.is_enabled():
+            set_statement_tracer(profiling.count_statement)
+        _timed("init_db", init_db)
+        _timed("migrate_state_file", migrate_state_file, SAVE_PATH)
+        _timed("start_mail_worker", start_mail_worker)
+        _timed("start_digest_scheduler", start_digest_scheduler)
+        threading.Thread(target=_prewarm, name="startup-prewarm", daemon=True).start()
+        _started = True
+
+
+def _prewarm():
+    # 리포트를 처음 열 때 기다리지 않도록 pandas/matplotlib과 폰트를 백그라운드에서 미리 로딩
+    try:
+        _timed("import pandas", __import__, "pandas")
+        _timed("import matplotlib", __import__, "matplotlib.pyplot")
+        ensure_font()
+    except Exception:
+        pass
+
+
+def ensure_font():
+    """NanumGothic 폰트를 matplotlib에 한 번만 등록합니다. (폰트명, 오류 메시지)를 반환합니다."""
+    global _font_name, _font_error, _font_done
+    if _font_done:
+        return _font_name, _font_error
+    with _font_lock:
+        if _font_done:
+            return _font_name, _font_error
+        start = time.perf_counter()
+        if os.path.exists(FONT_PATH):
+            try:
+                from matplotlib import font_manager, rcParams
+                font_manager.fontManager.addfont(FONT_PATH)
+                _font_name = font_manager.FontProperties(fname=FONT_PATH).get_name()
+                rcParams["font.family"] = _font_name
+            except Exception as e:
+                _font_error = f"폰트 적용 중 오류 발생: {e}"
+        else:
+            _font_error = "한글 폰트 파일을 찾을 수 없습니다. 기본 폰트를 사용합니다."
+        _timings["register font"] = time.perf_counter() - start
+        _font_done = True
+    return _font_name, _font_error
+
+
+def startup_timings():
+    return {name: round(seconds * 1000, 2) for name, seconds in _timings.items()}
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# db 모듈이 import 시점에 DB 경로를 읽으므로 먼저 임시 DB로 지정
+os.environ["SITE_COST_DB"] = os.path.join(tempfile.mkdtemp(prefix="scm-test-"), "test.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    import db
+    db.init_db()
+    return db
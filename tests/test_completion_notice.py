@@ -0,0 +1,42 @@
+import os
+
+import db
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _complete_all_steps(at):
+    """현재 화면의 절차를 마지막 단계 완료까지 진행합니다."""
+    while True:
+        [r for r in at.radio if r.label == "진행 상태"][0].set_value("완료").run()
+        move = [b for b in at.button if b.label == "다음 단계로 이동"][0]
+        if move.disabled:
+            return
+        move.click().run()
+
+
+def _completion_events():
+    with db.get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT 이벤트키 FROM 알림이벤트 WHERE 이벤트키 LIKE '%:완료:%'")]
+
+
+def test_completion_notice_after_reset(monkeypatch):
+    from streamlit.testing.v1 import AppTest
+
+    monkeypatch.chdir(ROOT)
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60)
+    at.session_state["logged_in"] = True
+    at.session_state["role"] = "관리자"
+    at.session_state["user"] = "admin1"
+    at.run()
+
+    _complete_all_steps(at)
+    first = set(_completion_events())
+    assert first
+
+    # 사이드바에서 같은 절차를 초기화한 뒤 다시 끝까지 완료하면 완료 알림이 한 번 더 기록됨
+    [b for b in at.sidebar.button if b.label.startswith("선택한 절차")][0].click().run()
+    _complete_all_steps(at)
+    second = set(_completion_events()) - first
+    assert len(second) == len(first)
+    assert not at.exception
@@ -0,0 +1,35 @@
+import pytest
+
+import db
+from workflow import WORKFLOW
+
+COST_TYPE = WORKFLOW.common_cost_types[0]
+KEY = f"저장시험_2024_01_{COST_TYPE}"
+CELL = ("저장시험", "2024", "01", COST_TYPE, 1)
+
+
+def test_unchanged_state_is_skipped_without_commit():
+    state = {"current_step": 1, "status": {"1": "진행중"}, "amounts": {}}
+    assert db.save_procedure_state(KEY, state) is True
+    before = db.save_stats()
+
+    # 바뀐 것이 없으면 쓰기 없이 건너뛰고 버전도 그대로
+    assert db.save_procedure_state(KEY, state) is False
+    assert state["version"] == 0
+    assert db.procedure_state_version(KEY) == 0
+
+    # 단계 상태를 함께 기록하면 내용이 같아도 커밋
+    state["status"]["1"] = "완료"
+    assert db.save_procedure_state(KEY, state, cells={CELL: "완료"}) is True
+    assert db.procedure_state_version(KEY) == 1
+
+    after = db.save_stats()
+    assert after["skipped"] == before["skipped"] + 1
+    assert after["committed"] == before["committed"] + 1
+
+
+def test_stale_version_still_conflicts():
+    state = db.load_procedure_state(KEY)
+    stale = dict(state, version=state["version"] - 1)
+    with pytest.raises(db.VersionConflict):
+        db.save_procedure_state(KEY, stale)
@@ -0,0 +1,98 @@
+import json
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+
+DEFINITION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflow.json")
+
+
+@dataclass(frozen=True)
+class Step:
+    cost_type: str
+    no: int
+    task: str
+    dept: str
+    cost_column: str = None   # 이 단계에서 입력하는 금액 항목 (기성금/노무비/투입비)
+
+
+@dataclass(frozen=True)
+class Workflow:
+    """정의 파일에서 한 번 컴파일되는 불변 절차 모델과 조회용 인덱스."""
+
+    flows: MappingProxyType             # 비용유형 → ((작업내용, 담당부서), ...)
+    steps: MappingProxyType             # 비용유형 → (Step, ...)
+    cost_columns: MappingProxyType      # (비용유형, 단계번호) → 금액 항목
+    cost_label_steps: MappingProxyType  # (비용유형, 금액 항목) → 단계번호
+    label_steps: MappingProxyType       # 금액 항목 → (Step, ...)
+    dept_steps: MappingProxyType        # 담당부서 → (Step, ...)
+    transitions: MappingProxyType       # (비용유형, 단계번호) → 다음 단계번호 (마지막 단계는 None)
+    site_cost_types: MappingProxyType   # 현장명 → (비용유형, ...)  (현장 전용 절차)
+    common_cost_types: tuple            # 모든 현장에서 쓰는 비용유형
+    sites: tuple                        # 등록된 현장명 (화면 선택지·API/업로드 검증)
+
+    def step(self, cost_type, step_no):
+        return self.steps[cost_type][step_no - 1]
+
+    def next_step(self, cost_type, step_no):
+        return self.transitions.get((cost_type, step_no))
+
+    def cost_types_for(self, site):
+        return self.common_cost_types + self.site_cost_types.get(site, ())
+
+
+def compile_workflow(definition):
+    flows, steps, cost_columns, cost_label_steps = {}, {}, {}, {}
+    label_steps, dept_steps, transitions, site_cost_types = {}, {}, {}, {}
+    common = []
+    sites = tuple(definition["sites"])
+
+    for entry in definition["cost_types"]:
+        cost_type = entry["name"]
+        if cost_type in steps:
+            raise ValueError(f"중복된 비용유형: {cost_type}")
+        compiled = tuple(
+            Step(cost_type, no, s["task"], s["dept"], s.get("cost"))
+            for no, s in enumerate(entry["steps"], start=1)
+        )
+        if not compiled:
+            raise ValueError(f"단계가 없는 비용유형: {cost_type}")
+        steps[cost_type] = compiled
+        flows[cost_type] = tuple((s.task, s.dept) for s in compiled)
+
+        for s in compiled:
+            dept_steps.setdefault(s.dept, []).append(s)
+            transitions[(cost_type, s.no)] = s.no + 1 if s.no < len(compiled) else None
+            if s.cost_column:
+                cost_columns[(cost_type, s.no)] = s.cost_column
+                cost_label_steps[(cost_type, s.cost_column)] = s.no
+                label_steps.setdefault(s.cost_column, []).append(s)
+
+        if entry.get("sites"):
+            for site in entry["sites"]:
+                if site not in sites:
+                    raise ValueError(f"등록되지 않은 현장: {site} ({cost_type})")
+                site_cost_types.setdefault(site, []).append(cost_type)
+        else:
+            common.append(cost_type)
+
+    freeze = lambda d: MappingProxyType({k: tuple(v) for k, v in d.items()})
+    return Workflow(
+        flows=MappingProxyType(flows),
+        steps=MappingProxyType(steps),
+        cost_columns=MappingProxyType(cost_columns),
+        cost_label_steps=MappingProxyType(cost_label_steps),
+        label_steps=freeze(label_steps),
+        dept_steps=freeze(dept_steps),
+        transitions=MappingProxyType(transitions),
+        site_cost_types=freeze(site_cost_types),
+        common_cost_types=tuple(common),
+        sites=sites,
+    )
+
+
+def load_workflow(path=DEFINITION_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return compile_workflow(json.load(f))
+
+
+WORKFLOW = load_workflow()